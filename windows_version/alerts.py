@@ -0,0 +1,213 @@
+import datetime
+import queue
+import threading
+import time
+
+LEVELS = ["YELLOW", "ORANGE", "RED"]
+_STOP = object()
+_RESET = object()
+# Seconds below a level before it clears: short for YELLOW, which the baseline
+# noise touches now and then, longer for the levels that matter more
+CLEAR_AFTER = {"YELLOW": 0.5, "ORANGE": 1.0, "RED": 2.0}
+
+
+def _timestamp(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else float(value)
+
+
+def _per_level(value):
+    return dict(value) if isinstance(value, dict) else {level: value for level in LEVELS}
+
+
+class AlertGate:
+    # Turns the per-sample alert levels into alert events. Each level is a separate
+    # latch: it raises once samples have stayed at or above it for `raise_after`
+    # seconds (0 raises on the first one) and clears only after `clear_after`
+    # seconds of samples below it. With `thresholds` (a callable returning the
+    # engine's current level thresholds) a raised level also holds while the
+    # deviation stays within `hysteresis` (a fraction) below its threshold, so a
+    # score hovering on a boundary does not flap. A sustained anomaly is therefore
+    # one "alert" event for the highest level that raised, another only if it
+    # escalates, and one "clear" event when the lowest level finally drops.
+    def __init__(self, raise_after=0.0, clear_after=CLEAR_AFTER, hysteresis=0.1, thresholds=None):
+        self.raise_after = _per_level(raise_after)
+        self.clear_after = _per_level(clear_after)
+        self.hysteresis = _per_level(hysteresis)
+        self.thresholds = thresholds
+        self.active = {level: False for level in LEVELS}
+        self.above_since = {level: None for level in LEVELS}
+        self.below_since = {level: None for level in LEVELS}
+        self.started = None
+        self.peak = 0.0
+        self.peak_level = None
+
+    def _holds(self, level, rank, deviation, limits):
+        if rank >= LEVELS.index(level):
+            return True
+        if limits is None or not self.active[level]:
+            return False
+        return deviation >= limits[level] * (1 - self.hysteresis[level])
+
+    def update(self, result):
+        now = _timestamp(result["time"])
+        deviation = result["deviation"]
+        rank = LEVELS.index(result["level"]) if result["level"] else -1
+        limits = self.thresholds() if self.thresholds is not None else None
+        raised = None
+        for level in LEVELS:
+            if self._holds(level, rank, deviation, limits):
+                self.below_since[level] = None
+                if self.above_since[level] is None:
+                    self.above_since[level] = now
+                if not self.active[level] and now - self.above_since[level] >= self.raise_after[level]:
+                    self.active[level] = True
+                    raised = level
+            else:
+                self.above_since[level] = None
+                if self.active[level]:
+                    if self.below_since[level] is None:
+                        self.below_since[level] = now
+                    if now - self.below_since[level] >= self.clear_after[level]:
+                        self.active[level] = False
+
+        events = []
+        if raised is not None:
+            if self.started is None:
+                self.started = now
+                self.peak = 0.0
+            if self.peak_level is None or LEVELS.index(raised) > LEVELS.index(self.peak_level):
+                self.peak_level = raised
+            events.append({"kind": "alert", "level": raised, "score": deviation, "time": result["time"],
+                           "result": result})
+        if self.started is not None:
+            self.peak = max(self.peak, deviation)
+            if not any(self.active.values()):
+                events.append({"kind": "clear", "level": self.peak_level, "score": self.peak,
+                               "time": result["time"], "duration": now - self.started})
+                self.started = None
+                self.peak_level = None
+        return events
+
+    def reset(self):
+        for level in LEVELS:
+            self.active[level] = False
+            self.above_since[level] = None
+            self.below_since[level] = None
+        self.started = None
+        self.peak_level = None
+
+
+class RateLimiter:
+    # Token bucket: up to `burst` events at once, refilled at `rate` per second.
+    # Time comes from the samples, so a replay is limited the same way as live data.
+    def __init__(self, rate=1.0, burst=5):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = None
+
+    def allow(self, now):
+        if self.last is None:
+            self.last = now
+        self.tokens = min(self.burst, self.tokens + max(now - self.last, 0.0) * self.rate)
+        self.last = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class AlertDispatcher:
+    # One long-lived thread between the detector and everything that reacts to an
+    # alert. put() only enqueues (a full queue drops the sample and counts it); the
+    # thread hands every alerting sample to the `samples=True` subscribers (e.g. the
+    # anomaly file) and runs the rest through an AlertGate and a RateLimiter, so
+    # notification sinks (sound, log, alert list) see one event per anomaly rather
+    # than one per sample. A subscriber that raises is counted and skipped.
+    def __init__(self, gate=None, limiter=None, maxsize=4096, metrics=None):
+        self.gate = gate or AlertGate()
+        self.limiter = limiter or RateLimiter()
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.sample_subscribers = []
+        self.event_subscribers = []
+        self.counts = {"samples": 0, "alerts": 0, "clears": 0, "suppressed": 0, "dropped": 0, "errors": 0}
+        # Whether the open anomaly got an alert through the rate limiter; a clear
+        # is only sent for one that did
+        self.notified = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback, samples=False):
+        (self.sample_subscribers if samples else self.event_subscribers).append(callback)
+        return callback
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="alerts", daemon=True)
+                self.thread.start()
+        return self
+
+    def put(self, result):
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(result)
+        except queue.Full:
+            self._count("dropped")
+
+    def reset(self):
+        # Forget any open anomaly, e.g. after a calibration or a method change
+        self.queue.put(_RESET)
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def _count(self, name):
+        self.counts[name] += 1
+        if self.metrics is not None:
+            self.metrics.inc(f"alerts.{name}")
+
+    def _call(self, callback, item):
+        try:
+            callback(item)
+        except Exception:
+            self._count("errors")
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            if item is _RESET:
+                self.gate.reset()
+                self.notified = False
+                continue
+            start = time.perf_counter()
+            self.dispatch(item)
+            if self.metrics is not None:
+                self.metrics.observe("alerts.dispatch", time.perf_counter() - start)
+
+    def dispatch(self, result):
+        if result["level"]:
+            self._count("samples")
+            for callback in self.sample_subscribers:
+                self._call(callback, result)
+        for event in self.gate.update(result):
+            if event["kind"] == "alert":
+                if not self.limiter.allow(_timestamp(event["time"])):
+                    self._count("suppressed")
+                    continue
+                self._count("alerts")
+                self.notified = True
+            else:
+                if not self.notified:
+                    continue
+                self.notified = False
+                self._count("clears")
+            for callback in self.event_subscribers:
+                self._call(callback, event)
@@ -0,0 +1,223 @@
+import csv
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+CSV_HEADER = ["Timestamp", "Deviation", "Z-Score", "Vector"]
+LEVEL_CODES = {None: 0, "YELLOW": 1, "ORANGE": 2, "RED": 3}
+BINARY_MAGIC = b"QDANOM1\n"
+_STOP = object()
+
+
+def record_dtype(width):
+    # One numeric column per field, vector components included (v0, v1, ...)
+    fields = [("time", "<f8"), ("deviation", "<f8"), ("zscore", "<f8"), ("level", "<i8")]
+    fields += [(f"v{i}", "<f8") for i in range(width)]
+    return np.dtype(fields)
+
+
+def write_binary_header(f, dtype):
+    header = json.dumps({"descr": dtype.descr}).encode("utf-8")
+    # Pad so the first record starts on a 64-byte boundary
+    size = len(BINARY_MAGIC) + 4 + len(header)
+    header += b" " * (-size % 64)
+    f.write(BINARY_MAGIC)
+    f.write(len(header).to_bytes(4, "little"))
+    f.write(header)
+
+
+def read_binary_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{os.path.basename(path)} is not a binary anomaly file")
+        length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(length))
+    dtype = np.dtype([tuple(field) for field in header["descr"]])
+    return dtype, len(BINARY_MAGIC) + 4 + length
+
+
+def load_binary(path):
+    # Memory-maps a binary anomaly file as a structured array (columns by name)
+    dtype, offset = read_binary_header(path)
+    rows = (os.path.getsize(path) - offset) // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(rows,))
+
+
+def vector_text(vector):
+    return str(vector.tolist() if isinstance(vector, np.ndarray) else list(vector))
+
+
+def binary_vectors(records):
+    names = [name for name in records.dtype.names if name.startswith("v")]
+    return np.stack([records[name] for name in names], axis=1) if names else np.zeros((len(records), 0))
+
+
+class AnomalyWriter:
+    # Writes alert records off the caller's thread. put() only enqueues; a worker
+    # flushes batches when `batch_size` records are waiting or the oldest has waited
+    # `flush_interval` seconds, and rotates files by size and/or age. Formats are
+    # "csv" (the classic anomalies.csv layout) and "bin" (fixed-width numeric records).
+    def __init__(self, path="anomalies.csv", formats=("csv",), batch_size=256, flush_interval=1.0,
+                 rotate_bytes=None, rotate_seconds=None, maxsize=10000, metrics=None):
+        self.base = os.path.splitext(path)[0]
+        self.formats = tuple(formats)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.files = {}
+        self.opened_at = {}
+        self.dtype = None
+        self.written = 0
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def path(self, fmt):
+        return f"{self.base}.{fmt}"
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def put(self, result, block=False):
+        # Non-blocking by default so a stalled disk never stalls the caller
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put(result, block=block)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self.flush(batch)
+                self.close_files()
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.flush(batch)
+                batch = []
+                deadline = None
+
+    def flush(self, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        for fmt in self.formats:
+            try:
+                if fmt == "csv":
+                    self.write_csv(batch)
+                elif fmt == "bin":
+                    self.write_binary(batch)
+            except OSError:
+                self.dropped += len(batch)
+        self.written += len(batch)
+        if self.metrics is not None:
+            self.metrics.observe("writer.flush", time.perf_counter() - start)
+
+    def rotate(self, fmt, opened_at):
+        stamp = datetime.datetime.fromtimestamp(opened_at).strftime("%Y%m%d-%H%M%S")
+        target = f"{self.base}-{stamp}.{fmt}"
+        n = 1
+        while os.path.exists(target):
+            target = f"{self.base}-{stamp}-{n}.{fmt}"
+            n += 1
+        os.replace(self.path(fmt), target)
+
+    def open_file(self, fmt):
+        f = self.files.get(fmt)
+        if f is not None and self.should_rotate(fmt, f):
+            f.close()
+            self.rotate(fmt, self.opened_at[fmt])
+            f = None
+        if f is None:
+            path = self.path(fmt)
+            is_new = not os.path.isfile(path) or os.path.getsize(path) == 0
+            if fmt == "bin" and not is_new:
+                # Never append records to a file written with a different layout
+                try:
+                    matches = read_binary_header(path)[0] == self.dtype
+                except ValueError:
+                    matches = False
+                if not matches:
+                    self.rotate(fmt, os.path.getmtime(path))
+                    is_new = True
+            if fmt == "csv":
+                f = open(path, "a", newline="")
+                if is_new:
+                    csv.writer(f).writerow(CSV_HEADER)
+            else:
+                f = open(path, "ab")
+                if is_new:
+                    write_binary_header(f, self.dtype)
+            self.files[fmt] = f
+            self.opened_at[fmt] = time.time()
+        return f
+
+    def should_rotate(self, fmt, f):
+        if self.rotate_bytes and f.tell() >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds and time.time() - self.opened_at[fmt] >= self.rotate_seconds:
+            return True
+        return False
+
+    def write_csv(self, batch):
+        f = self.open_file("csv")
+        writer = csv.writer(f)
+        writer.writerows([r["time"], r["deviation"], r["zscore"], vector_text(r["vector"])] for r in batch)
+        f.flush()
+
+    def write_binary(self, batch):
+        width = len(batch[0]["vector"])
+        if self.dtype is None or len(self.dtype.names) != 4 + width:
+            # A different vector width needs its own file layout
+            if "bin" in self.files:
+                self.files.pop("bin").close()
+                self.rotate("bin", self.opened_at["bin"])
+            self.dtype = record_dtype(width)
+        f = self.open_file("bin")
+        records = np.zeros(len(batch), dtype=self.dtype)
+        records["time"] = [r["time"].timestamp() if isinstance(r["time"], datetime.datetime) else r["time"] for r in batch]
+        records["deviation"] = [r["deviation"] for r in batch]
+        records["zscore"] = [r["zscore"] for r in batch]
+        records["level"] = [LEVEL_CODES.get(r["level"], 0) for r in batch]
+        vectors = np.asarray([r["vector"] for r in batch], dtype=np.float64)
+        for i in range(width):
+            records[f"v{i}"] = vectors[:, i]
+        f.write(records.tobytes())
+        f.flush()
+
+    def close_files(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
@@ -0,0 +1,240 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from detector_engine import LEVELS, METHODS, PRESETS, load_vectors
+from scorers import chi_square_z, robust_row_scores, zscore_row_scores
+
+# Rows per block: bounds the memory of the window views and the rounding of the
+# cumulative sums, which restart at every block
+BLOCK = 8192
+
+
+# Whole-array versions of the engine's scorers. Each takes every sample of a
+# recording at once and returns what a fresh DetectorEngine would have produced
+# sample by sample, to floating-point rounding: the rolling windows are strided
+# views and cumulative sums instead of a Python loop per sample.
+
+def magnitudes(vectors):
+    return np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+
+
+def windows(values, window, current):
+    # (N, window) strided view of each sample's window, left-padded with zeros:
+    # the `window` values before it, or ending with it when `current` is set.
+    # Also returns how many real values each row holds and where they are.
+    n = len(values)
+    pad = window - 1 if current else window
+    padded = np.concatenate([np.zeros(pad), values])
+    view = sliding_window_view(padded, window)[:n]
+    counts = np.minimum(np.arange(n) + (1 if current else 0), window)
+    valid = np.arange(window) >= window - counts[:, None]
+    return view, counts, valid
+
+
+def _blocks(n):
+    for lo in range(0, n, BLOCK):
+        yield lo, min(lo + BLOCK, n)
+
+
+def attractor_scores(vectors, window=50):
+    # Distance from the centroid of the last `window` vectors, current included
+    n, d = vectors.shape
+    scores = np.zeros(n)
+    for lo, hi in _blocks(n):
+        start = max(lo - window + 1, 0)
+        chunk = vectors[start:hi]
+        # Centred on the block mean so the running sums stay small
+        center = chunk.mean(axis=0)
+        sums = np.concatenate([np.zeros((1, d)), np.cumsum(chunk - center, axis=0)])
+        rows = np.arange(lo, hi)
+        last = rows - start + 1
+        first = np.maximum(rows - window + 1, 0) - start
+        counts = last - first
+        centroid = (sums[last] - sums[first]) / counts[:, None] + center
+        distance = np.sqrt(np.sum((vectors[lo:hi] - centroid) ** 2, axis=1))
+        scores[lo:hi] = np.where(counts >= 2, distance, 0.0)
+    return scores
+
+
+def zscore_scores(values, window=30, min_samples=10):
+    # |z| of each magnitude against the `window` magnitudes before it
+    view, counts, valid = windows(values, window, current=False)
+    scores = np.zeros(len(values))
+    for lo, hi in _blocks(len(values)):
+        scores[lo:hi] = zscore_row_scores(values[lo:hi], view[lo:hi], counts[lo:hi], valid[lo:hi],
+                                          counts[lo:hi] >= min_samples)
+    return scores
+
+
+def robust_scores(values, window=50, min_samples=10):
+    # (IQR, MAD) scores of each magnitude against the `window` magnitudes before it
+    view, counts, valid = windows(values, window, current=False)
+    iqr = np.zeros(len(values))
+    mad = np.zeros(len(values))
+    for lo, hi in _blocks(len(values)):
+        iqr[lo:hi], mad[lo:hi] = robust_row_scores(values[lo:hi], view[lo:hi], counts[lo:hi], valid[lo:hi],
+                                                   counts[lo:hi] >= min_samples)
+    return iqr, mad
+
+
+def linear_recurrence(a, u, x0):
+    # x[t] = a[t] * x[t - 1] + u[t] from x[-1] = x0, for 0 < a[t] <= 1, as
+    # x[t] = P[t] * (x0 + sum(u[k] / P[k], k <= t)) with P the running product of a.
+    # Runs are cut where P would underflow; each starts from the previous run's end.
+    out = np.empty_like(u)
+    shape = (-1,) + (1,) * (u.ndim - 1)
+    lo = 0
+    while lo < len(a):
+        log_p = np.cumsum(np.log(a[lo:]))
+        hi = lo + max(int(np.searchsorted(-log_p, 600.0)), 1)
+        p = np.exp(log_p[:hi - lo]).reshape(shape)
+        out[lo:hi] = p * (x0 + np.cumsum(u[lo:hi] / p, axis=0))
+        x0 = out[hi - 1]
+        lo = hi
+    return out
+
+
+def mahalanobis_scores(vectors, window=100, min_samples=20, reinvert_every=1, ridge=1e-3):
+    # MahalanobisScorer over a whole recording. Its weighted mean and covariance are
+    # linear recurrences in the sample weight; the inverse it keeps by rank-1
+    # updates is exactly the inverse of the covariance plus the ridge added at the
+    # last re-inversion, decayed by the same weights, so here that matrix is built
+    # for every sample and the distances come from one batched solve per block.
+    n, d = vectors.shape
+    scores = np.zeros(n)
+    if n == 0:
+        return scores
+    interval = max(int(window * reinvert_every), 1)
+    first_inversion = max(min_samples, 1) - 1
+    floor = 1e-12
+
+    mean = vectors[0].copy()
+    cov = np.zeros((d, d))
+    rho = ridge * floor if first_inversion == 0 else np.nan
+    eye = np.eye(d)
+    matrix = cov + rho * eye
+    for lo, hi in _blocks(n):
+        lo = max(lo, 1)
+        if lo >= hi:
+            continue
+        t = np.arange(lo, hi)
+        alpha = np.maximum(1.0 / (t + 1), 1.0 / window)
+        keep = 1.0 - alpha
+        x = vectors[lo:hi]
+        means = linear_recurrence(keep, alpha[:, None] * x, mean)
+        previous = np.concatenate([mean[None, :], means[:-1]])
+        delta = x - previous
+        outer = delta[:, :, None] * delta[:, None, :]
+        covs = linear_recurrence(keep, (alpha * keep)[:, None, None] * outer, cov)
+
+        # Ridge term: reset at each re-inversion, decayed by `keep` in between
+        inverted = (t >= first_inversion) & ((t - first_inversion) % interval == 0)
+        log_keep = np.cumsum(np.log(keep))
+        last = np.maximum.accumulate(np.where(inverted, np.arange(hi - lo), -1))
+        resets = ridge * np.maximum(np.trace(covs, axis1=1, axis2=2) / d, floor)
+        base = np.where(last >= 0, resets[np.maximum(last, 0)], rho)
+        since = np.where(last >= 0, log_keep[np.maximum(last, 0)], 0.0)
+        rhos = base * np.exp(log_keep - since)
+        matrices = covs + np.where(np.isnan(rhos), 0.0, rhos)[:, None, None] * eye
+
+        # Each sample is scored against the state left by the one before it
+        ready = t - 1 >= first_inversion
+        if ready.any():
+            before = np.concatenate([matrix[None], matrices[:-1]])[ready]
+            solved = np.linalg.solve(before, delta[ready][:, :, None])[:, :, 0]
+            d2 = np.maximum(np.einsum("ij,ij->i", delta[ready], solved), 0.0)
+            scores[t[ready]] = np.maximum(chi_square_z(d2, d), 0.0)
+
+        mean, cov, rho, matrix = means[-1], covs[-1], rhos[-1], matrices[-1]
+    return scores
+
+
+def anomaly_scores(vectors, attractor_window=50, zscore_window=30, robust_window=50, mahalanobis_window=100):
+    # {method: scores} for every method, as DetectorEngine.calculate_anomaly_score
+    # would have returned them for each row of `vectors`
+    vectors = np.asarray(vectors, dtype=np.float64)
+    values = magnitudes(vectors)
+    scores = {
+        "Attractor": attractor_scores(vectors, attractor_window),
+        "Z-Score": zscore_scores(values, zscore_window),
+    }
+    scores["IQR"], scores["MAD"] = robust_scores(values, robust_window)
+    scores["Mahalanobis"] = mahalanobis_scores(vectors, mahalanobis_window)
+    return scores
+
+
+def deviation_zscores(deviations, window=50, min_samples=10):
+    # DetectorEngine.calculate_zscore for every sample: the signed z of each
+    # deviation against the last `window` deviations, itself included
+    deviations = np.asarray(deviations, dtype=np.float64)
+    view, counts, valid = windows(deviations, window, current=True)
+    out = np.zeros(len(deviations))
+    for lo, hi in _blocks(len(deviations)):
+        rows = slice(lo, hi)
+        n = np.maximum(counts[rows], 1)
+        data = view[rows]
+        mean = np.where(valid[rows], data, 0).sum(axis=1) / n
+        std = np.sqrt(np.where(valid[rows], (data - mean[:, None]) ** 2, 0).sum(axis=1) / n)
+        constant = (np.where(valid[rows], data, np.inf).min(axis=1)
+                    == np.where(valid[rows], data, -np.inf).max(axis=1))
+        ok = (counts[rows] >= min_samples) & (std != 0) & ~constant
+        out[rows] = np.where(ok, (deviations[rows] - mean) / np.where(ok, std, 1), 0.0)
+    return out
+
+
+def classify(deviations, sensitivity):
+    # Level index per sample: 0 none, 1 YELLOW, 2 ORANGE, 3 RED (DetectorEngine.classify)
+    deviations = np.asarray(deviations)
+    return np.select([deviations > sensitivity * 1.6, deviations > sensitivity, deviations > sensitivity * 0.6],
+                     [3, 2, 1], 0)
+
+
+def backtest(scores, sensitivities):
+    # Alert counts per level for each sensitivity over one method's scores
+    results = {}
+    for sensitivity in sensitivities:
+        counts = np.bincount(classify(scores, sensitivity), minlength=4)
+        results[sensitivity] = {level: int(counts[i + 1]) for i, level in enumerate(LEVELS)}
+    return results
+
+
+def load_array(path):
+    vectors = [vector for _, vector in load_vectors(path)]
+    if not vectors:
+        raise ValueError(f"{os.path.basename(path)} has no recorded vectors")
+    return np.asarray(vectors, dtype=np.float64)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a recording in one pass and backtest sensitivity presets")
+    parser.add_argument("path", help="anomalies CSV/.bin file or a .qds/.json session")
+    parser.add_argument("--method", choices=METHODS, help="only backtest this method")
+    parser.add_argument("--sensitivity", type=float, nargs="+",
+                        help=f"sensitivities to backtest (default: the presets, {', '.join(map(str, PRESETS.values()))})")
+    args = parser.parse_args(argv)
+
+    vectors = load_array(args.path)
+    start = time.perf_counter()
+    scores = anomaly_scores(vectors)
+    elapsed = time.perf_counter() - start
+    print(f"{len(vectors)} samples x {vectors.shape[1]} channels scored in {elapsed * 1000:.0f} ms")
+
+    sensitivities = args.sensitivity or list(PRESETS.values())
+    names = {value: name for name, value in PRESETS.items()}
+    print(f"{'method':<13}{'sensitivity':<24}" + "".join(f"{level:>9}" for level in LEVELS) + f"{'alert %':>9}")
+    for method in ([args.method] if args.method else METHODS):
+        for sensitivity, counts in backtest(scores[method], sensitivities).items():
+            label = f"{sensitivity:g}" + (f" ({names[sensitivity]})" if sensitivity in names else "")
+            total = sum(counts.values())
+            print(f"{method:<13}{label:<24}" + "".join(f"{counts[level]:>9}" for level in LEVELS)
+                  + f"{100 * total / len(vectors):>8.2f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
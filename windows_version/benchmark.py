@@ -0,0 +1,304 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import batch
+from anomaly_writer import AnomalyWriter
+from datalog import DataLog
+from detector_engine import METHODS, DetectorEngine
+from rendering import SpectrumRenderer, WaveformRenderer
+from scorers import MahalanobisScorer
+from session_file import load_session_file, write_session
+from sources import FakeSource, SourceSampler
+
+# History lengths of the 1min, 5min, 15min and 1hr timescales at 10 Hz
+LENGTHS = [600, 3000, 9000, 36000]
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# Largest difference allowed between the batch scores and the streaming engine's
+BATCH_TOLERANCE = 1e-6
+# Mahalanobis window short enough that its decay underflows inside one batch block
+SHORT_WINDOW = 5
+
+
+class StubCanvas:
+    # Enough of tk.Canvas for the renderers to run headless
+    def __init__(self, width=1000, height=250):
+        self.width = width
+        self.height = height
+        self.items = {}
+        self.next_id = 1
+
+    def _create(self, *coords, **options):
+        item = self.next_id
+        self.next_id += 1
+        self.items[item] = [list(coords), options]
+        return item
+
+    create_line = create_rectangle = create_text = _create
+
+    def coords(self, item, *coords):
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+        self.items[item][0] = list(coords)
+
+    def itemconfig(self, item, **options):
+        self.items[item][1].update(options)
+
+    def delete(self, item):
+        self.items.pop(item, None)
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+
+def synthetic_vectors(n, seed=0):
+    sampler = SourceSampler([FakeSource(seed=seed)]).start()
+    return [sampler.get_system_vector() for _ in range(n)]
+
+
+def warm_engine(length, vectors):
+    engine = DetectorEngine(history_len=length)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(length):
+        engine.process(vectors[i % len(vectors)], start + datetime.timedelta(seconds=i / 10))
+    return engine
+
+
+def measure(fn, calls, alloc_calls):
+    # Per-call latency (ns) over `calls` calls, then traced allocations over a
+    # separate, shorter pass so tracing does not distort the timings
+    times = np.empty(calls)
+    for i in range(calls):
+        t0 = time.perf_counter_ns()
+        fn()
+        times[i] = time.perf_counter_ns() - t0
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(alloc_calls):
+        fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "calls": calls,
+        "p50_us": float(np.percentile(times, 50)) / 1000,
+        "p90_us": float(np.percentile(times, 90)) / 1000,
+        "p99_us": float(np.percentile(times, 99)) / 1000,
+        "retained_bytes_per_call": (current - before) / alloc_calls,
+        "peak_bytes": peak - before,
+    }
+
+
+def cases(length, vectors, workdir):
+    # Yields (name, fn, calls) for one history length
+    engine = warm_engine(length, vectors)
+    results = [engine.process(vectors[i % len(vectors)]) for i in range(256)]
+    stream = iter(range(10 ** 9))
+
+    def next_vector():
+        return vectors[next(stream) % len(vectors)]
+
+    for method in METHODS:
+        scorer = engine.scorers[method]
+
+        def score(scorer=scorer):
+            v = next_vector()
+            scorer.update(v, math.hypot(*v))
+        yield f"score.{method}", score, 2000
+
+    def anomaly_score():
+        engine.calculate_anomaly_score(next_vector())
+    yield "calculate_anomaly_score", anomaly_score, 2000
+    yield "calculate_zscore", engine.calculate_zscore, 2000
+
+    wave = WaveformRenderer(StubCanvas(1000, 250))
+
+    def draw_waveform():
+        # As in the GUI: a few new samples per frame, then an incremental redraw
+        for result in results[:5]:
+            engine.record(result)
+        history, position, mean, std = engine.waveform()
+        wave.draw(history, engine.threshold_yellow, engine.threshold_orange, engine.threshold_red, position, mean, std)
+    yield "draw_waveform", draw_waveform, 300
+
+    fft = SpectrumRenderer(StubCanvas(1000, 200))
+
+    def draw_fft():
+        freqs, magnitude = engine.get_spectrum()
+        fft.draw(freqs, magnitude)
+    yield "draw_fft", draw_fft, 300
+
+    writer = AnomalyWriter(os.path.join(workdir, f"anomalies-{length}.csv"), formats=("csv", "bin"))
+    yield "log_anomaly_csv.put", lambda: writer.put(results[0]), 2000
+    # Drain what put() queued before timing the writer's batched flush directly
+    writer.close()
+    yield "log_anomaly_csv.flush256", lambda: writer.flush(results), 50
+    writer.close_files()
+
+    history = engine.snapshot()
+    log = DataLog(ram_rows=100000)
+    for i in range(length):
+        log.append(results[i % len(results)])
+    path = os.path.join(workdir, f"session-{length}.qds")
+    meta = {"version": 1, "config": {"sensitivity": engine.sensitivity}, "alerts": []}
+    yield "save_session", lambda: write_session(path, meta, history.copy(), log), 20
+
+    def load_session():
+        _, arrays = load_session_file(path)
+        # Touch the columns so mapped pages are actually read
+        for array in arrays.values():
+            np.sum(array)
+    yield "load_session", load_session, 20
+    log.close()
+
+    # Whole-recording scoring, per call over `length` samples
+    array = np.asarray([vectors[i % len(vectors)] for i in range(length)])
+    yield "batch.anomaly_scores", lambda: batch.anomaly_scores(array), 5
+    for method, fn in (("Attractor", batch.attractor_scores), ("Mahalanobis", batch.mahalanobis_scores)):
+        yield f"batch.{method}", lambda fn=fn: fn(array), 5
+
+
+def check_vectors(n=20000, seed=1):
+    # Longer than two batch blocks, with an integer-valued and a constant channel
+    vectors = np.asarray(synthetic_vectors(n, seed=seed))
+    vectors[:, 0] = np.round(vectors[:, 0] * 10)
+    vectors[:, 1] = vectors[0, 1]
+    return vectors
+
+
+def check_batch(vectors):
+    # Largest difference between batch.py and the streaming path fed the same
+    # vectors: a fresh engine's scorers per method, its deviation z-score, and a
+    # short-window Mahalanobis scorer whose weights underflow within a block
+    scores = batch.anomaly_scores(vectors)
+    engine = DetectorEngine()
+    streamed = {method: np.empty(len(vectors)) for method in METHODS}
+    short = MahalanobisScorer(window=SHORT_WINDOW)
+    short_streamed = np.empty(len(vectors))
+    for i, v in enumerate(vectors):
+        magnitude = math.hypot(*v)
+        for method, scorer in engine.scorers.items():
+            streamed[method][i] = scorer.update(v, magnitude)
+        short_streamed[i] = short.update(v)
+
+    errors = {}
+    start = datetime.datetime(2024, 1, 1)
+    for method in METHODS:
+        errors[method] = float(np.max(np.abs(streamed[method] - scores[method]), initial=0.0))
+        zscores = np.empty(len(vectors))
+        deviations = DetectorEngine(method=method)
+        for i, deviation in enumerate(streamed[method]):
+            deviations.record({"time": start + datetime.timedelta(seconds=i / 10), "deviation": deviation})
+            zscores[i] = deviations.calculate_zscore()
+        error = float(np.max(np.abs(zscores - batch.deviation_zscores(streamed[method])), initial=0.0))
+        errors["calculate_zscore"] = max(errors.get("calculate_zscore", 0.0), error)
+    short_batch = batch.mahalanobis_scores(vectors, window=SHORT_WINDOW)
+    errors[f"Mahalanobis@{SHORT_WINDOW}"] = float(np.max(np.abs(short_streamed - short_batch), initial=0.0))
+    return errors
+
+
+def report_batch_check(vectors):
+    # Prints the check; returns 1 if any error is out of tolerance
+    errors = check_batch(vectors)
+    failed = [name for name, error in errors.items() if not error <= BATCH_TOLERANCE]
+    print(f"batch vs streaming max error over {len(vectors)} samples: "
+          + ", ".join(f"{name} {error:.1e}" for name, error in errors.items()))
+    for name in failed:
+        print(f"MISMATCH batch.{name}: {errors[name]:.3g} > {BATCH_TOLERANCE:g}")
+    return 1 if failed else 0
+
+
+def run(lengths, calls_scale=1.0, only=None):
+    vectors = synthetic_vectors(4096)
+    workdir = tempfile.mkdtemp(prefix="quantum_bench_")
+    report = {}
+    try:
+        for length in lengths:
+            for name, fn, calls in cases(length, vectors, workdir):
+                if only and only not in name:
+                    continue
+                calls = max(int(calls * calls_scale), 5)
+                report[f"{name}@{length}"] = measure(fn, calls, max(calls // 10, 5))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    # Cases whose median latency regressed by more than `tolerance` (a fraction)
+    regressions = []
+    for case, result in report.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        limit = base["p50_us"] * (1 + tolerance)
+        if result["p50_us"] > limit:
+            regressions.append((case, base["p50_us"], result["p50_us"]))
+    return regressions
+
+
+def print_report(report):
+    print(f"{'case':<34}{'calls':>7}{'p50 us':>11}{'p90 us':>11}{'p99 us':>11}{'B/call':>10}{'peak B':>11}")
+    for case, r in report.items():
+        print(f"{case:<34}{r['calls']:>7}{r['p50_us']:>11.1f}{r['p90_us']:>11.1f}{r['p99_us']:>11.1f}"
+              f"{r['retained_bytes_per_call']:>10.0f}{r['peak_bytes']:>11}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detector's scorers, renderers and I/O paths")
+    parser.add_argument("--lengths", type=int, nargs="+", default=LENGTHS, help="history lengths in samples")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the calls")
+    parser.add_argument("--only", metavar="TEXT", help="run only cases whose name contains TEXT")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing (fraction)")
+    parser.add_argument("--no-compare", action="store_true", help="print the report without a baseline comparison")
+    parser.add_argument("--check", action="store_true", help="only check batch.py against the streaming scorers")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return report_batch_check(check_vectors())
+
+    report = run(args.lengths, 0.1 if args.quick else 1.0, args.only)
+    print_report(report)
+
+    if report_batch_check(check_vectors()):
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if args.no_compare:
+        return 0
+    if not os.path.isfile(args.baseline):
+        # Without a baseline the regression gate would pass whatever happened
+        print(f"No baseline at {args.baseline}: create one with --save-baseline on a reference run, "
+              f"or pass --no-compare to only print the report")
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance)
+    for case, before, after in regressions:
+        print(f"REGRESSION {case}: p50 {before:.1f} us -> {after:.1f} us")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+SCALAR_FIELDS = ["time", "entropy", "deviation", "zscore"]
+
+
+class DataLog:
+    # Struct-of-arrays sample log: float64 timestamps (epoch seconds) plus one
+    # fixed-width float64 block per field. Rows fill preallocated RAM chunks; once more
+    # than `ram_rows` are held, the oldest full chunks are appended to one raw file per
+    # field under `spill_dir` and read back through np.memmap, never as Python objects.
+    def __init__(self, ram_rows=100000, chunk_rows=4096, spill_dir=None, vector_width=None):
+        self.chunk_rows = int(chunk_rows)
+        self.ram_chunks = max(int(ram_rows) // self.chunk_rows, 1)
+        self.spill_dir = spill_dir
+        self.owns_spill_dir = spill_dir is None
+        self.vector_width = vector_width
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.fill = 0
+        self.disk_rows = 0
+        self.generation = 0
+        self.maps = {}
+
+    def __len__(self):
+        return self.disk_rows + self.ram_rows()
+
+    def ram_rows(self):
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * self.chunk_rows + self.fill
+
+    def widths(self):
+        widths = {name: 1 for name in SCALAR_FIELDS}
+        widths["vector"] = self.vector_width
+        return widths
+
+    def _new_chunk(self):
+        return {name: np.empty((self.chunk_rows, width)) for name, width in self.widths().items()}
+
+    def append(self, result):
+        ts = result["time"]
+        if isinstance(ts, datetime.datetime):
+            ts = ts.timestamp()
+        vector = result["vector"]
+        with self.lock:
+            if self.vector_width is None:
+                self.vector_width = len(vector)
+            if not self.chunks or self.fill == self.chunk_rows:
+                self.chunks.append(self._new_chunk())
+                self.fill = 0
+                if len(self.chunks) > self.ram_chunks:
+                    self._spill(self.chunks.pop(0), self.chunk_rows)
+            chunk = self.chunks[-1]
+            row = self.fill
+            chunk["time"][row] = ts
+            chunk["entropy"][row] = result["entropy"]
+            chunk["deviation"][row] = result["deviation"]
+            chunk["zscore"][row] = result["zscore"]
+            chunk["vector"][row] = vector
+            self.fill += 1
+
+    def path(self, name):
+        return os.path.join(self.spill_dir, f"{name}.{self.generation}.f8")
+
+    def _spill(self, chunk, rows):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="quantum_log_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for name, block in chunk.items():
+            with open(self.path(name), "ab") as f:
+                block[:rows].tofile(f)
+        self.disk_rows += rows
+        self.maps.clear()
+
+    def _disk_view(self, name):
+        if self.disk_rows == 0:
+            return None
+        view = self.maps.get(name)
+        if view is None:
+            width = self.widths()[name]
+            view = np.memmap(self.path(name), dtype=np.float64, mode="r", shape=(self.disk_rows, width))
+            self.maps[name] = view
+        return view
+
+    def iter_chunks(self, name):
+        # Yields the spilled (memory-mapped) block and then each RAM chunk, all 2-D
+        with self.lock:
+            parts = []
+            disk = self._disk_view(name)
+            if disk is not None:
+                parts.append(disk)
+            for i, chunk in enumerate(self.chunks):
+                rows = self.fill if i == len(self.chunks) - 1 else self.chunk_rows
+                parts.append(chunk[name][:rows].copy())
+        return iter(parts)
+
+    def column(self, name):
+        # Whole history of one field; 1-D for scalar fields, (rows, width) for vectors
+        parts = list(self.iter_chunks(name))
+        if not parts:
+            width = self.widths()[name] or 0
+            data = np.empty((0, width))
+        elif len(parts) == 1:
+            data = parts[0]
+        else:
+            data = np.concatenate(parts)
+        return data[:, 0] if name in SCALAR_FIELDS else data
+
+    def slice(self, name, start, stop):
+        # Rows [start, stop) of one field without materialising the rest of the log
+        parts = []
+        offset = 0
+        for part in self.iter_chunks(name):
+            lo, hi = max(start - offset, 0), min(stop - offset, len(part))
+            if lo < hi:
+                parts.append(part[lo:hi])
+            offset += len(part)
+        width = self.widths()[name] or 0
+        data = np.concatenate(parts) if parts else np.empty((0, width))
+        return data[:, 0] if name in SCALAR_FIELDS else data
+
+    def flush(self):
+        # Spill everything held in RAM so the files on disk hold the complete log
+        with self.lock:
+            for i, chunk in enumerate(self.chunks):
+                rows = self.fill if i == len(self.chunks) - 1 else self.chunk_rows
+                if rows:
+                    self._spill(chunk, rows)
+            self.chunks = []
+            self.fill = 0
+
+    def clear(self):
+        with self.lock:
+            self.chunks = []
+            self.fill = 0
+            self.maps.clear()
+            if self.spill_dir and self.disk_rows:
+                # Old files may still be mapped by a reader, so start a new generation
+                # and remove them on a best-effort basis
+                for name in self.widths():
+                    try:
+                        os.remove(self.path(name))
+                    except OSError:
+                        pass
+                self.generation += 1
+            self.disk_rows = 0
+
+    def close(self):
+        self.clear()
+        if self.owns_spill_dir and self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
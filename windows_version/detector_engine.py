@@ -0,0 +1,424 @@
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from anomaly_writer import AnomalyWriter, binary_vectors, load_binary
+from entropy import EntropyPool
+from metrics import Metrics, MetricsServer, rss_bytes
+from session_file import load_session_file
+from scheduler import DeadlineScheduler
+from scorers import (AttractorScorer, IQRScorer, MADScorer, MahalanobisScorer, RollingStats, SortedWindow,
+                     ZScoreScorer)
+from sources import SourceSampler, build_sources
+from spectrum import WelchSpectrum
+
+METHODS = ["Attractor", "Z-Score", "IQR", "MAD", "Mahalanobis"]
+LEVELS = ["YELLOW", "ORANGE", "RED"]
+# Sensitivity presets offered by the GUI and backtested by batch.py
+PRESETS = {"High Sensitivity": 2.0, "Balanced": 5.0, "Low Noise": 10.0}
+
+
+class SystemSampler(SourceSampler):
+    # The sensor set behind the detector: "system" reads the real hardware, "fake"
+    # and "replay:<file>" stand in for it (see sources.build_sources). With
+    # start=False the sources are only opened by a later start() call.
+    def __init__(self, backend="system", workers=2, metrics=None, start=True):
+        super().__init__(build_sources(backend), workers, metrics)
+        self.gpu_info = "GPU: Detecting..."
+        self.ram_info = "RAM: Detecting..."
+        if start:
+            self.start()
+
+    def start(self):
+        super().start()
+        infos = {source.name: source.info() for source in self.sources}
+        self.gpu_info = infos.get("nvml") or "GPU: Not sampled"
+        self.ram_info = infos.get("mem_latency") or " | ".join(self.info()) or "RAM: Not sampled"
+        return self
+
+
+class DetectorEngine:
+    def __init__(self, method="Attractor", sensitivity=5.0, history_len=600,
+                 attractor_window=50, zscore_window=30, robust_window=50, baseline_window=50,
+                 mahalanobis_window=100, sample_rate=10.0, spectrum_segment=128, metrics=None,
+                 warm_scorers=True, harvest_entropy=True):
+        self.method = method
+        self.metrics = metrics or Metrics()
+        # The deviation history is the window of a RollingStats, so the waveform's
+        # band (mean and std of the whole history) costs O(1) per sample to keep
+        self.history_stats = RollingStats(history_len)
+        self.history = self.history_stats.values
+        # Samples pushed since the history was last cleared, loaded or resized
+        # (`history_epoch` counts those), so a renderer can tell what is new
+        self.history_total = 0
+        self.history_epoch = 0
+        self.spectrum = WelchSpectrum(sample_rate, spectrum_segment, span=history_len)
+        # Streaming scorers are fed every sample so switching methods starts from a warm
+        # window; with warm_scorers=False (e.g. a replay, where the method is fixed) only
+        # the active one is, and a method switched to starts cold
+        self.warm_scorers = warm_scorers
+        self.scorers = {
+            "Attractor": AttractorScorer(attractor_window),
+            "Z-Score": ZScoreScorer(zscore_window),
+            "IQR": IQRScorer(robust_window),
+            "MAD": MADScorer(robust_window),
+            "Mahalanobis": MahalanobisScorer(mahalanobis_window)
+        }
+        self.score_stages = {name: f"score.{name}" for name in self.scorers}
+        self.deviation_stats = RollingStats(baseline_window)
+        # Low-order bits of every sample are harvested into a conditioned byte pool,
+        # unless harvest_entropy=False (results then report an entropy of 0)
+        self.harvest_entropy = harvest_entropy
+        self.entropy_pool = EntropyPool()
+        self.metrics.gauge("entropy.bytes_per_s", self.entropy_pool.output_rate)
+        self.metrics.gauge("entropy.available", self.entropy_pool.available)
+        # Sample rate measured from the per-sample timestamps (median interval, so a
+        # pause does not skew it); the spectrum's frequency axis follows it
+        self.nominal_rate = float(sample_rate)
+        self.intervals = SortedWindow(256)
+        self.last_time = None
+        self.lock = threading.Lock()
+        self.set_sensitivity(sensitivity)
+
+    def set_sensitivity(self, value):
+        self.sensitivity = float(value)
+        self.threshold_orange = self.sensitivity
+        self.threshold_yellow = self.sensitivity * 0.6
+        self.threshold_red = self.sensitivity * 1.6
+
+    def thresholds(self):
+        return {"YELLOW": self.threshold_yellow, "ORANGE": self.threshold_orange, "RED": self.threshold_red}
+
+    def set_method(self, method):
+        if method not in METHODS:
+            raise ValueError(f"Unknown detection method: {method}")
+        self.method = method
+
+    def set_sample_rate(self, rate):
+        with self.lock:
+            self.nominal_rate = float(rate)
+            self.intervals.clear()
+            self.last_time = None
+            self.spectrum.set_sample_rate(rate)
+
+    def measured_rate(self):
+        if len(self.intervals) < 2:
+            return self.nominal_rate
+        interval = self.intervals.median()
+        return 1.0 / interval if interval > 0 else self.nominal_rate
+
+    def samples_for(self, seconds):
+        # History length covering `seconds` at the measured rate
+        return max(int(round(seconds * self.measured_rate())), 2)
+
+    def _track_rate(self, timestamp):
+        t = timestamp.timestamp() if isinstance(timestamp, datetime.datetime) else float(timestamp)
+        if self.last_time is not None and t > self.last_time:
+            self.intervals.push(t - self.last_time)
+            rate = self.measured_rate()
+            if abs(rate - self.spectrum.sample_rate) > 0.02 * self.spectrum.sample_rate:
+                self.spectrum.set_sample_rate(rate)
+        self.last_time = t
+
+    def resize_history(self, maxlen):
+        with self.lock:
+            self.history_stats.resize(maxlen)
+            self._reset_history_count()
+            self.spectrum.set_span(maxlen)
+
+    def _reset_history_count(self):
+        self.history_total = len(self.history)
+        self.history_epoch += 1
+
+    def load_history(self, values):
+        with self.lock:
+            self.history_stats.clear()
+            self.history.extend(values)
+            self.history_stats.resync()
+            self._reset_history_count()
+            self.deviation_stats.clear()
+            for value in self.history.latest(self.deviation_stats.window):
+                self.deviation_stats.push(value)
+            self.spectrum.clear()
+            self.spectrum.extend(self.history.latest())
+
+    def calibrate(self):
+        with self.lock:
+            for scorer in self.scorers.values():
+                scorer.clear()
+            self.deviation_stats.clear()
+            self.spectrum.clear()
+            self.history_stats.clear()
+            self._reset_history_count()
+
+    def snapshot(self, n=None):
+        # Zero-copy view of the most recent deviations; rows may be overwritten by later
+        # samples, so copy it if it has to outlive the current frame
+        with self.lock:
+            return self.history.latest(n)
+
+    def waveform(self):
+        # What WaveformRenderer.draw needs, taken together: the history view, its
+        # (epoch, total) position and its mean and std
+        with self.lock:
+            stats = self.history_stats
+            return self.history.latest(), (self.history_epoch, self.history_total), stats.mean, stats.std
+
+    def get_spectrum(self):
+        # (freqs in Hz, amplitude) of the Welch estimate over the current history span
+        with self.lock:
+            return self.spectrum.magnitude()
+
+    def calculate_anomaly_score(self, vector):
+        method = self.method
+        magnitude = math.hypot(*vector)
+
+        score = 0
+        observe = self.metrics.observe
+        scorers = self.scorers.items() if self.warm_scorers else ((method, self.scorers[method]),)
+        for name, scorer in scorers:
+            start = time.perf_counter()
+            value = scorer.update(vector, magnitude)
+            observe(self.score_stages[name], time.perf_counter() - start)
+            if name == method:
+                score = value
+        return score
+
+    def calculate_zscore(self):
+        stats = self.deviation_stats
+        if len(stats) < 10:
+            return 0
+        std = stats.std
+        if std == 0:
+            return 0
+        return (self.history.last() - stats.mean) / std
+
+    def classify(self, deviation):
+        if deviation > self.threshold_red:
+            return "RED"
+        elif deviation > self.threshold_orange:
+            return "ORANGE"
+        elif deviation > self.threshold_yellow:
+            return "YELLOW"
+        return None
+
+    def _push(self, deviation):
+        self.history_stats.push(deviation)
+        self.history_total += 1
+        self.deviation_stats.push(deviation)
+        self.spectrum.push(deviation)
+
+    def record(self, result):
+        # Adds a result scored elsewhere (e.g. by a worker process) to the history
+        # and spectrum without re-scoring it
+        with self.lock:
+            self._track_rate(result["time"])
+            self._push(result["deviation"])
+
+    def process(self, vector, timestamp=None):
+        # Only caller-supplied timestamps (scheduler ticks, recorded times) feed the rate
+        measured = timestamp is not None
+        if not measured:
+            timestamp = datetime.datetime.now()
+        with self.lock:
+            if measured:
+                self._track_rate(timestamp)
+            entropy = 0.0
+            if self.harvest_entropy:
+                with self.metrics.time("entropy"):
+                    self.entropy_pool.add(vector)
+                    entropy = self.entropy_pool.entropy()
+            deviation = float(self.calculate_anomaly_score(vector))
+            self._push(deviation)
+            with self.metrics.time("zscore"):
+                zscore = float(self.calculate_zscore())
+        return {
+            "time": timestamp,
+            "entropy": entropy,
+            "deviation": deviation,
+            "zscore": zscore,
+            "level": self.classify(deviation),
+            "vector": vector
+        }
+
+
+class ResultQueue:
+    # Bounded handoff from the sampling thread to a consumer that drains in batches.
+    # When the consumer stalls the oldest results are dropped (and counted) instead of
+    # piling up without limit.
+    def __init__(self, maxlen=1024):
+        self.items = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, result):
+        with self.lock:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(result)
+            self.received += 1
+
+    def drain(self):
+        with self.lock:
+            items = list(self.items)
+            self.items.clear()
+        return items
+
+    def __len__(self):
+        return len(self.items)
+
+
+def load_vectors(path):
+    # Yields (timestamp, vector) from an anomalies CSV/binary file or a saved session
+    if path.lower().endswith(".qds"):
+        _, arrays = load_session_file(path)
+        if "log.vector" not in arrays:
+            raise ValueError(f"{os.path.basename(path)} has no recorded vectors to replay")
+        for ts, vector in zip(arrays["log.time"], arrays["log.vector"]):
+            yield datetime.datetime.fromtimestamp(ts), vector.tolist()
+        return
+
+    if path.lower().endswith(".bin"):
+        records = load_binary(path)
+        vectors = binary_vectors(records)
+        for ts, vector in zip(records["time"], vectors):
+            yield datetime.datetime.fromtimestamp(ts), vector.tolist()
+        return
+
+    if path.lower().endswith(".json"):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if "vectors" not in data:
+            raise ValueError(f"{os.path.basename(path)} has no recorded vectors to replay")
+        times = data.get("times") or [None] * len(data["vectors"])
+        for ts, vector in zip(times, data["vectors"]):
+            yield (datetime.datetime.fromisoformat(ts) if ts else None), vector
+        return
+
+    with open(path, 'r', newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if "Vector" not in header:
+            raise ValueError(f"{os.path.basename(path)} has no Vector column")
+        time_col = header.index("Timestamp") if "Timestamp" in header else None
+        vector_col = header.index("Vector")
+        for row in reader:
+            if len(row) <= vector_col:
+                continue
+            ts = datetime.datetime.fromisoformat(row[time_col]) if time_col is not None else None
+            yield ts, json.loads(row[vector_col])
+
+
+def replay(engine, records):
+    # Feeds recorded vectors through the scorers as fast as they can be scored
+    for ts, vector in records:
+        yield engine.process(vector, ts)
+
+
+def run_live(engine, sampler, on_result, scheduler, stop_event=None):
+    # One sample per scheduler tick, stamped with the tick time
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        tick = scheduler.wait(stop_event)
+        if tick is None:
+            break
+        with engine.metrics.time("sample"):
+            vector = sampler.get_system_vector()
+        with engine.metrics.time("process"):
+            result = engine.process(vector, datetime.datetime.fromtimestamp(tick))
+        on_result(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Quantum Anomaly Detector engine")
+    parser.add_argument("--method", choices=METHODS, default="Attractor")
+    parser.add_argument("--sensitivity", type=float, default=5.0)
+    parser.add_argument("--history", type=int, default=600, help="history length in samples")
+    parser.add_argument("--attractor-window", type=int, default=50)
+    parser.add_argument("--zscore-window", type=int, default=30)
+    parser.add_argument("--robust-window", type=int, default=50, help="IQR/MAD window length in samples")
+    parser.add_argument("--mahalanobis-window", type=int, default=100,
+                        help="Mahalanobis averaging window (exponential weight 1/N) in samples")
+    parser.add_argument("--replay", metavar="FILE", help="re-score vectors from an anomalies CSV/.bin file or a .qds/.json session")
+    parser.add_argument("--output", metavar="FILE", help="append alerting samples to this file (.csv or .bin)")
+    parser.add_argument("--all", action="store_true", help="with --replay, write every sample rather than alerts only")
+    parser.add_argument("--entropy", action="store_true",
+                        help="with --replay, still harvest and report entropy (slower; otherwise reported as 0)")
+    parser.add_argument("--rate", type=float, default=10.0, help="live sample rate in Hz (up to 1000)")
+    parser.add_argument("--metrics-port", type=int, help="serve metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--backend", default="system",
+                        help='live sensor backend: "system", "fake", "replay:FILE" or comma-separated source names')
+    args = parser.parse_args(argv)
+
+    metrics = Metrics()
+    metrics.gauge("rss_bytes", rss_bytes)
+    writer = None
+    if args.output:
+        fmt = "bin" if args.output.lower().endswith(".bin") else "csv"
+        writer = AnomalyWriter(args.output, formats=(fmt,), metrics=metrics)
+        metrics.gauge("queue.writer", writer.queue.qsize)
+    engine = DetectorEngine(args.method, args.sensitivity, args.history,
+                            attractor_window=args.attractor_window, zscore_window=args.zscore_window,
+                            robust_window=args.robust_window, mahalanobis_window=args.mahalanobis_window,
+                            sample_rate=args.rate, metrics=metrics,
+                            warm_scorers=not args.replay, harvest_entropy=not args.replay or args.entropy)
+    if args.metrics_port:
+        MetricsServer(metrics, args.metrics_port).start()
+    counts = {level: 0 for level in LEVELS}
+
+    def handle(result):
+        level = result["level"]
+        if level:
+            counts[level] += 1
+        if writer and (level or (args.replay and args.all)):
+            writer.put(result, block=bool(args.replay))
+        if level and not args.replay:
+            print(f"[{result['time']:%H:%M:%S}] {level} ALERT! Score: {result['deviation']:.2f}", flush=True)
+
+    if args.replay:
+        t0 = time.perf_counter()
+        n = 0
+        for result in replay(engine, load_vectors(args.replay)):
+            handle(result)
+            n += 1
+        elapsed = time.perf_counter() - t0
+        rate = n / elapsed if elapsed > 0 else 0
+        if writer:
+            writer.close()
+        print(f"Replayed {n} samples in {elapsed:.2f}s ({rate:.0f} samples/s) with {args.method}, sensitivity {args.sensitivity:.2f}")
+        print("  " + "  ".join(f"{level}: {counts[level]}" for level in LEVELS))
+        return 0
+
+    scheduler = DeadlineScheduler(args.rate)
+    sampler = SystemSampler(args.backend, metrics=metrics)
+    metrics.gauge("scheduler.overruns", lambda: scheduler.overruns)
+    metrics.gauge("scheduler.skipped", lambda: scheduler.skipped)
+    metrics.gauge("scheduler.lateness_seconds", lambda: scheduler.lateness)
+    metrics.gauge("sample_rate_hz", engine.measured_rate)
+    print(f"{sampler.gpu_info} | {sampler.ram_info} | method {args.method} | {args.rate:g} Hz", flush=True)
+    try:
+        run_live(engine, sampler, handle, scheduler)
+    except KeyboardInterrupt:
+        pass
+    sampler.close()
+    if writer:
+        writer.close()
+    stats = scheduler.stats()
+    print(f"  {stats['ticks']} ticks at {stats['measured_rate']:.1f} Hz | overruns {stats['overruns']} | "
+          f"skipped {stats['skipped']} | max lateness {stats['max_lateness'] * 1000:.2f} ms")
+    print("  " + "  ".join(f"{level}: {counts[level]}" for level in LEVELS))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+DIGEST_BYTES = 32
+# Credited bits consumed per digest: twice its output, so each output bit is
+# backed by at least two bits of estimated min-entropy
+DIGEST_CREDIT = 2 * 8 * DIGEST_BYTES
+
+
+class EntropyPool:
+    # Harvests the low-order bits of every sensor channel plus the timing jitter
+    # between samples. Each sample adds one `bits`-bit symbol per channel to a
+    # rolling window of the last `window` samples; per-channel symbol histograms are
+    # updated as symbols enter and leave it, so the Shannon and min-entropy
+    # estimates cost O(channels) per sample whatever the window. Channels are
+    # credited with their min-entropy only, so a stuck or slowly moving channel adds
+    # nothing. Every DIGEST_CREDIT credited bits, the raw symbols collected since
+    # the last output are conditioned through SHA-256 into 32 bytes of the output
+    # pool, which read() drains. When the pool is full new output is discarded.
+    def __init__(self, bits=4, window=4096, pool_bytes=65536, min_samples=64, refresh=64, rate_window=5.0):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+        self.bits = bits
+        self.mask = np.uint64((1 << bits) - 1)
+        self.window = int(window)
+        self.pool_bytes = pool_bytes
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.channels = None
+        self.pool = bytearray()
+        self.raw = bytearray()
+        self.credit = 0.0
+        self.counter = 0
+        self.last_ns = None
+        self.samples = 0
+        self.raw_bits = 0
+        self.credited_bits = 0.0
+        self.output_bytes = 0
+        self.read_bytes = 0
+        self.discarded_bytes = 0
+        self.history = deque()
+
+    def _reset(self, channels):
+        self.channels = channels
+        self.symbols = np.zeros((self.window, channels), dtype=np.uint8)
+        self.counts = np.zeros((channels, 1 << self.bits), dtype=np.int64)
+        self.filled = 0
+        self.position = 0
+        # Flat histogram slot of (channel, symbol) is channel * 2**bits + symbol
+        self.offsets = np.arange(channels, dtype=np.int64) << self.bits
+        self.row = np.zeros(channels, dtype=np.uint64)
+        self.sample_credit = None
+        self.estimate = None
+        self.since_refresh = 0
+
+    def add(self, vector, timestamp_ns=None):
+        # One sample: the same steps as add_many without the batch bookkeeping
+        now = time.perf_counter_ns() if timestamp_ns is None else int(timestamp_ns)
+        interval = 0 if self.last_ns is None else now - self.last_ns
+        self.last_ns = now
+        values = np.asarray(vector, dtype=np.float64)
+        with self.lock:
+            if self.channels != len(values) + 1:
+                self._reset(len(values) + 1)
+            row = self.row
+            row[:-1] = values.view(np.uint64)
+            row[-1] = interval & 0xFFFFFFFFFFFFFFFF
+            symbols = (row & self.mask).astype(np.uint8)
+            counts = self.counts.reshape(-1)
+            if self.filled == self.window:
+                counts[self.symbols[self.position] + self.offsets] -= 1
+            else:
+                self.filled += 1
+            counts[symbols + self.offsets] += 1
+            self.symbols[self.position] = symbols
+            self.position = (self.position + 1) % self.window
+            self.raw += symbols.tobytes()
+            self._credit(1)
+
+    def add_many(self, vectors, timestamps_ns=None):
+        # (n, d) vectors; the jitter channel is the low bits of the ns interval
+        # between consecutive samples (all taken now if no timestamps are given)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+        n = len(vectors)
+        if n == 0:
+            return
+        if timestamps_ns is None:
+            timestamps_ns = np.full(n, time.perf_counter_ns(), dtype=np.int64)
+        stamps = np.asarray(timestamps_ns, dtype=np.int64)
+        previous = stamps[0] if self.last_ns is None else self.last_ns
+        intervals = np.diff(stamps, prepend=previous)
+        self.last_ns = int(stamps[-1])
+
+        # Low bits of the IEEE-754 pattern: the last mantissa bits of a reading and
+        # of the interval are where measurement noise lives
+        bits = np.empty((n, vectors.shape[1] + 1), dtype=np.uint64)
+        bits[:, :-1] = vectors.view(np.uint64)
+        bits[:, -1] = intervals.view(np.uint64)
+        symbols = (bits & self.mask).astype(np.uint8)
+
+        with self.lock:
+            if self.channels != symbols.shape[1]:
+                self._reset(symbols.shape[1])
+            for start in range(0, n, self.window):
+                self._push(symbols[start:start + self.window])
+            self.raw += symbols.tobytes()
+            self._credit(n)
+
+    def _credit(self, n):
+        # Credits n samples at the window's min-entropy, re-estimated every
+        # `refresh` samples since it moves slowly
+        self.samples += n
+        self.raw_bits += n * self.channels * self.bits
+        if self.filled < self.min_samples:
+            self._trim_raw()
+            return
+        self.since_refresh += n
+        if self.since_refresh >= self.refresh or self.sample_credit is None:
+            self.since_refresh = 0
+            self.sample_credit = float(self.min_entropy().sum())
+            self.estimate = float(self.shannon_entropy().mean() / self.bits)
+        credit = n * self.sample_credit
+        self.credit += credit
+        self.credited_bits += credit
+        if self.credit >= DIGEST_CREDIT:
+            self._condition(int(self.credit // DIGEST_CREDIT))
+        self._trim_raw()
+
+    def _trim_raw(self):
+        # While credit accrues slowly (stuck sensors credit nothing) the raw symbols
+        # would pile up; past twice a window of samples the oldest are dropped down
+        # to one window, along with the share of the pending credit they carried
+        limit = self.window * self.channels
+        size = len(self.raw)
+        if size > 2 * limit:
+            del self.raw[:size - limit]
+            self.credit *= limit / size
+
+    def _push(self, symbols):
+        k = len(symbols)
+        slots = (self.position + np.arange(k)) % self.window
+        size = self.counts.size
+        counts = self.counts.reshape(-1)
+        if self.filled + k > self.window:
+            old = self.symbols[slots[:self.filled + k - self.window]]
+            counts -= np.bincount((old + self.offsets).ravel(), minlength=size)
+        counts += np.bincount((symbols + self.offsets).ravel(), minlength=size)
+        self.symbols[slots] = symbols
+        self.position = (self.position + k) % self.window
+        self.filled = min(self.filled + k, self.window)
+
+    def _condition(self, digests):
+        # Splits the raw symbols into `digests` slices and hashes each separately, so
+        # every output block is backed by its own share of the credited input
+        self.credit -= digests * DIGEST_CREDIT
+        raw = bytes(self.raw)
+        self.raw.clear()
+        step = len(raw) / digests
+        for i in range(digests):
+            chunk = raw[int(i * step):int((i + 1) * step)]
+            digest = hashlib.sha256(self.counter.to_bytes(8, "little") + chunk).digest()
+            self.counter += 1
+            self.output_bytes += DIGEST_BYTES
+            if len(self.pool) + DIGEST_BYTES > self.pool_bytes:
+                self.discarded_bytes += DIGEST_BYTES
+            else:
+                self.pool += digest
+        now = time.monotonic()
+        self.history.append((now, self.output_bytes))
+        while self.history and now - self.history[0][0] > self.rate_window:
+            self.history.popleft()
+
+    def read(self, n):
+        # Up to n conditioned bytes; fewer (possibly none) if the pool is short
+        with self.lock:
+            data = bytes(self.pool[:n])
+            del self.pool[:len(data)]
+            self.read_bytes += len(data)
+        return data
+
+    def available(self):
+        return len(self.pool)
+
+    def shannon_entropy(self):
+        # Per-channel Shannon entropy of the windowed symbols, in bits per symbol
+        if self.channels is None or self.filled == 0:
+            return np.zeros(0 if self.channels is None else self.channels)
+        p = self.counts / self.filled
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return -np.sum(np.where(p > 0, p * np.log2(p), 0.0), axis=1)
+
+    def min_entropy(self):
+        if self.channels is None or self.filled == 0:
+            return np.zeros(0 if self.channels is None else self.channels)
+        return np.log2(self.filled / self.counts.max(axis=1))
+
+    def entropy(self):
+        # Mean Shannon entropy per harvested bit, 0 (constant) to 1 (uniform); once
+        # the window has min_samples it is refreshed along with the credit rate
+        if self.channels is not None and self.estimate is not None:
+            return self.estimate
+        h = self.shannon_entropy()
+        return float(h.mean() / self.bits) if len(h) else 0.0
+
+    def output_rate(self):
+        # Conditioned bytes per second over the last `rate_window` seconds
+        with self.lock:
+            if len(self.history) < 2:
+                return 0.0
+            (t0, b0), (t1, b1) = self.history[0], self.history[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "raw_bits": self.raw_bits,
+            "credited_bits": self.credited_bits,
+            "output_bytes": self.output_bytes,
+            "read_bytes": self.read_bytes,
+            "discarded_bytes": self.discarded_bytes,
+            "available": self.available(),
+            "output_rate": self.output_rate(),
+            "entropy": self.entropy(),
+        }
+
+
+def main(argv=None):
+    from detector_engine import SystemSampler
+    parser = argparse.ArgumentParser(description="Harvest entropy from the sensor sources and report the rate")
+    parser.add_argument("--backend", default="system", help='sensor backend: "system", "fake" or "replay:FILE"')
+    parser.add_argument("--seconds", type=float, default=10.0, help="how long to sample")
+    parser.add_argument("--bits", type=int, default=4, help="low-order bits taken from each channel")
+    parser.add_argument("--output", metavar="FILE", help="append the conditioned bytes to FILE")
+    args = parser.parse_args(argv)
+
+    sampler = SystemSampler(args.backend)
+    pool = EntropyPool(args.bits)
+    out = open(args.output, "ab") if args.output else None
+    start = time.perf_counter()
+    try:
+        # Samples back to back: this measures what the sources can sustain
+        while time.perf_counter() - start < args.seconds:
+            pool.add(sampler.get_system_vector())
+            if out is not None and pool.available() >= 4096:
+                out.write(pool.read(4096))
+    finally:
+        sampler.close()
+        if out is not None:
+            out.write(pool.read(pool.available()))
+            out.close()
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    per_channel = " ".join(f"{h:.2f}" for h in pool.min_entropy())
+    print(f"{stats['samples']} samples in {elapsed:.1f}s ({stats['samples'] / elapsed:.0f}/s)")
+    print(f"min-entropy per channel (bits of {args.bits}): {per_channel}")
+    print(f"raw {stats['raw_bits'] / 8 / elapsed:.0f} B/s | credited {stats['credited_bits'] / 8 / elapsed:.0f} B/s"
+          f" | output {stats['output_bytes'] / elapsed:.0f} B/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
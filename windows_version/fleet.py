@@ -0,0 +1,495 @@
+import argparse
+import json
+import selectors
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from detector_engine import LEVELS, METHODS, SystemSampler
+from scheduler import DeadlineScheduler
+from scorers import chi_square_z, robust_row_scores, zscore_row_scores
+
+DEFAULT_ADDRESS = "127.0.0.1:7878"
+# A node opens with one JSON line ({"node": name, "width": d}) and then streams
+# fixed-size frames of 1 + d little-endian float64s: timestamp, then the vector
+HELLO_LIMIT = 4096
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def encode_frame(timestamp, vector):
+    return np.asarray([timestamp, *vector], dtype="<f8").tobytes()
+
+
+class RowRing:
+    # One sliding window per row (node), all in one array. Rows fill from slot 0, so
+    # the first counts[i] slots of a row are exactly its valid samples.
+    def __init__(self, rows, window, width=None):
+        self.window = int(window)
+        self.width = width
+        shape = (rows, self.window) if width is None else (rows, self.window, width)
+        self.data = np.zeros(shape)
+        self.counts = np.zeros(rows, dtype=np.int64)
+        self.pushes = np.zeros(rows, dtype=np.int64)
+
+    def grow(self, rows):
+        extra = rows - len(self.counts)
+        if extra <= 0:
+            return
+        self.data = np.concatenate([self.data, np.zeros((extra,) + self.data.shape[1:])])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.pushes = np.concatenate([self.pushes, np.zeros(extra, dtype=np.int64)])
+
+    def clear(self, rows):
+        self.data[rows] = 0
+        self.counts[rows] = 0
+        self.pushes[rows] = 0
+
+    def rows(self, idx):
+        counts = self.counts[idx]
+        valid = np.arange(self.window) < counts[:, None]
+        return self.data[idx], counts, valid
+
+    def push(self, idx, values):
+        self.data[idx, self.pushes[idx] % self.window] = values
+        self.pushes[idx] += 1
+        self.counts[idx] = np.minimum(self.counts[idx] + 1, self.window)
+
+
+class RowCovariance:
+    # One MahalanobisScorer state per row: weighted mean, covariance and inverse
+    # covariance, updated for a batch of rows at once with the same rank-1 and
+    # Sherman-Morrison steps
+    def __init__(self, rows, width, window=100, min_samples=20, reinvert_every=1, ridge=1e-3):
+        self.width = width
+        self.window = int(window)
+        self.min_samples = min_samples
+        self.reinvert_interval = max(int(self.window * reinvert_every), 1)
+        self.ridge = ridge
+        self.mean = np.zeros((rows, width))
+        self.cov = np.zeros((rows, width, width))
+        self.precision = np.zeros((rows, width, width))
+        self.ready = np.zeros(rows, dtype=bool)
+        self.counts = np.zeros(rows, dtype=np.int64)
+        self.since = np.zeros(rows, dtype=np.int64)
+
+    def grow(self, rows):
+        extra = rows - len(self.counts)
+        if extra <= 0:
+            return
+        for name in ("mean", "cov", "precision", "ready", "counts", "since"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros((extra,) + array.shape[1:], dtype=array.dtype)]))
+
+    def clear(self, rows):
+        for name in ("mean", "cov", "precision", "ready", "counts", "since"):
+            getattr(self, name)[rows] = 0
+
+    def invert(self, rows):
+        if len(rows) == 0:
+            return
+        d = self.width
+        cov = self.cov[rows]
+        ridge = self.ridge * np.maximum(np.trace(cov, axis1=1, axis2=2) / d, 1e-12)
+        regularised = cov + ridge[:, None, None] * np.eye(d)
+        try:
+            self.precision[rows] = np.linalg.inv(regularised)
+        except np.linalg.LinAlgError:
+            self.precision[rows] = np.linalg.pinv(regularised)
+        self.ready[rows] = True
+        self.since[rows] = 0
+
+    def update(self, idx, vectors):
+        # Scores rows `idx` against their state so far, then adds the (k, d) vectors
+        idx = np.asarray(idx)
+        delta = vectors - self.mean[idx]
+        ready = self.ready[idx]
+        scores = np.zeros(len(idx))
+        u = np.einsum("kij,kj->ki", self.precision[idx[ready]], delta[ready])
+        d2 = np.maximum(np.einsum("ki,ki->k", delta[ready], u), 0.0)
+        scores[ready] = np.maximum(chi_square_z(d2, self.width), 0.0)
+
+        counts = self.counts[idx] + 1
+        self.counts[idx] = counts
+        alpha = np.maximum(1.0 / counts, 1.0 / self.window)
+        self.mean[idx] += alpha[:, None] * delta
+        outer = delta[:, :, None] * delta[:, None, :]
+        self.cov[idx] = (1.0 - alpha)[:, None, None] * (self.cov[idx] + alpha[:, None, None] * outer)
+
+        rows = idx[ready]
+        a = alpha[ready]
+        step = (a / (1.0 + a * d2))[:, None, None] * (u[:, :, None] * u[:, None, :])
+        self.precision[rows] = (self.precision[rows] - step) / (1.0 - a)[:, None, None]
+        self.since[rows] += 1
+        due = ready & (self.since[idx] >= self.reinvert_interval)
+        due |= ~ready & (counts >= self.min_samples)
+        self.invert(idx[due])
+        return scores
+
+
+class FleetScorer:
+    # Scores many nodes at once: each call takes the rows that have a new vector and
+    # runs Attractor, Z-Score, IQR, MAD and Mahalanobis over all of them in one numpy
+    # pass. The per-node semantics match the streaming scorers in scorers.py.
+    def __init__(self, width, nodes=64, attractor_window=50, zscore_window=30, robust_window=50,
+                 mahalanobis_window=100, min_samples=10):
+        self.width = width
+        self.min_samples = min_samples
+        self.vectors = RowRing(nodes, attractor_window, width)
+        self.zscore = RowRing(nodes, zscore_window)
+        self.robust = RowRing(nodes, robust_window)
+        self.covariance = RowCovariance(nodes, width, mahalanobis_window)
+
+    def grow(self, nodes):
+        for ring in (self.vectors, self.zscore, self.robust, self.covariance):
+            ring.grow(nodes)
+
+    def clear(self, rows):
+        for ring in (self.vectors, self.zscore, self.robust, self.covariance):
+            ring.clear(rows)
+
+    def update(self, idx, vectors):
+        # Returns {method: scores} for rows `idx` given their new (k, d) vectors
+        vectors = np.asarray(vectors, dtype=np.float64)
+        magnitudes = np.sqrt(np.sum(vectors * vectors, axis=1))
+        scores = {
+            "Z-Score": self._zscore(idx, magnitudes),
+        }
+        scores["IQR"], scores["MAD"] = self._robust(idx, magnitudes)
+        scores["Mahalanobis"] = self.covariance.update(idx, vectors)
+        self.zscore.push(idx, magnitudes)
+        self.robust.push(idx, magnitudes)
+
+        # The attractor centroid includes the current vector
+        self.vectors.push(idx, vectors)
+        data, counts, valid = self.vectors.rows(idx)
+        centroid = np.where(valid[:, :, None], data, 0).sum(axis=1) / np.maximum(counts, 1)[:, None]
+        attractor = np.linalg.norm(vectors - centroid, axis=1)
+        scores["Attractor"] = np.where(counts >= 2, attractor, 0.0)
+        return scores
+
+    def _zscore(self, idx, magnitudes):
+        data, counts, valid = self.zscore.rows(idx)
+        return zscore_row_scores(magnitudes, data, counts, valid, counts >= self.min_samples)
+
+    def _robust(self, idx, magnitudes):
+        data, counts, valid = self.robust.rows(idx)
+        return robust_row_scores(magnitudes, data, counts, valid, counts >= self.min_samples)
+
+
+class Connection:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.buffer = bytearray()
+        self.slot = None
+        self.frame_bytes = None
+
+
+class FleetAggregator:
+    # Accepts node streams on one selectors loop and scores every node that sent a
+    # vector since the previous tick in a single FleetScorer pass. A node's frames
+    # are coalesced to the newest between ticks. A fleet alert is raised when at
+    # least `fleet_fraction` of the connected nodes are at ORANGE or above.
+    def __init__(self, address=DEFAULT_ADDRESS, rate=10.0, method="Attractor", sensitivity=5.0,
+                 fleet_fraction=0.25, min_fleet_nodes=2, on_alert=None, **scorer_options):
+        if method not in METHODS:
+            raise ValueError(f"Unknown detection method: {method}")
+        self.address = parse_address(address)
+        self.period = 1.0 / rate
+        self.method = method
+        self.fleet_fraction = fleet_fraction
+        self.min_fleet_nodes = min_fleet_nodes
+        self.on_alert = on_alert or (lambda kind, detail: None)
+        self.scorer_options = scorer_options
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.scorer = None
+        self.width = None
+        self.names = []
+        self.slots = {}
+        self.latest = np.zeros((0, 0))
+        self.fresh = np.zeros(0, dtype=bool)
+        self.connected = np.zeros(0, dtype=bool)
+        self.levels = np.zeros(0, dtype=np.int64)
+        self.fleet_alarm = False
+        self.ticks = 0
+        self.overruns = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.counts = {level: 0 for level in LEVELS + ["FLEET"]}
+        self.set_sensitivity(sensitivity)
+
+    def set_sensitivity(self, value):
+        # Same YELLOW/ORANGE/RED ladder as DetectorEngine
+        self.sensitivity = float(value)
+        self.thresholds = np.array([self.sensitivity * 0.6, self.sensitivity, self.sensitivity * 1.6])
+
+    def listen(self):
+        self.listener = socket.create_server(self.address, backlog=1024)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()[:2]
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        return self.address
+
+    def _slot(self, name, width):
+        if self.width is None:
+            self.width = width
+            self.scorer = FleetScorer(width, **self.scorer_options)
+            self.latest = np.zeros((0, width))
+        if width != self.width:
+            return None
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = len(self.names)
+            self.names.append(name)
+            self.slots[name] = slot
+            if slot >= len(self.fresh):
+                size = max(2 * len(self.fresh), 64)
+                self.scorer.grow(size)
+                self.latest = np.concatenate([self.latest, np.zeros((size - len(self.latest), width))])
+                self.fresh = np.concatenate([self.fresh, np.zeros(size - len(self.fresh), dtype=bool)])
+                self.connected = np.concatenate([self.connected, np.zeros(size - len(self.connected), dtype=bool)])
+                self.levels = np.concatenate([self.levels, np.zeros(size - len(self.levels), dtype=np.int64)])
+        else:
+            # A reconnecting node starts a fresh window
+            self.scorer.clear([slot])
+        self.connected[slot] = True
+        return slot
+
+    def _accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, Connection(sock, address))
+
+    def _close(self, conn):
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+        if conn.slot is not None:
+            self.connected[conn.slot] = False
+            self.fresh[conn.slot] = False
+            self.levels[conn.slot] = 0
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        buffer = conn.buffer
+        buffer += data
+
+        if conn.slot is None:
+            end = buffer.find(b"\n")
+            if end < 0:
+                if len(buffer) > HELLO_LIMIT:
+                    self.rejected += 1
+                    self._close(conn)
+                return
+            try:
+                hello = json.loads(buffer[:end])
+                slot = self._slot(str(hello["node"]), int(hello["width"]))
+            except (ValueError, KeyError, TypeError):
+                slot = None
+            if slot is None:
+                self.rejected += 1
+                self._close(conn)
+                return
+            conn.slot = slot
+            conn.frame_bytes = 8 * (1 + self.width)
+            del buffer[:end + 1]
+
+        frames = len(buffer) // conn.frame_bytes
+        if frames:
+            values = np.frombuffer(bytes(buffer[(frames - 1) * conn.frame_bytes:frames * conn.frame_bytes]), dtype="<f8")
+            self.latest[conn.slot] = values[1:]
+            if self.fresh[conn.slot]:
+                self.coalesced += 1
+            self.coalesced += frames - 1
+            self.fresh[conn.slot] = True
+            del buffer[:frames * conn.frame_bytes]
+
+    def tick(self):
+        self.ticks += 1
+        idx = np.flatnonzero(self.fresh)
+        if len(idx) == 0:
+            return None
+        self.fresh[idx] = False
+        scores = self.scorer.update(idx, self.latest[idx])
+        levels = np.searchsorted(self.thresholds, scores[self.method], side="left")
+        self.levels[idx] = levels
+        for i in np.flatnonzero(levels):
+            level = LEVELS[levels[i] - 1]
+            self.counts[level] += 1
+            self.on_alert(level, {"node": self.names[idx[i]], "score": float(scores[self.method][i])})
+
+        # Fleet-wide: a correlated anomaly across many machines
+        active = int(np.count_nonzero(self.connected))
+        alarmed = int(np.count_nonzero(self.levels[self.connected] >= 2))
+        alarm = active >= self.min_fleet_nodes and alarmed >= self.fleet_fraction * active
+        if alarm and not self.fleet_alarm:
+            self.counts["FLEET"] += 1
+            self.on_alert("FLEET", {"nodes": alarmed, "active": active})
+        self.fleet_alarm = alarm
+        return idx, scores
+
+    def serve(self, stop_event=None, duration=None):
+        stop_event = stop_event or threading.Event()
+        if self.listener is None:
+            self.listen()
+        start = time.perf_counter()
+        deadline = start + self.period
+        while not stop_event.is_set():
+            now = time.perf_counter()
+            if duration is not None and now - start >= duration:
+                break
+            for key, _ in self.selector.select(timeout=max(deadline - now, 0)):
+                if key.data is None:
+                    self._accept()
+                else:
+                    self._read(key.data)
+            now = time.perf_counter()
+            if now >= deadline:
+                self.tick()
+                late = now - deadline
+                if late >= self.period:
+                    self.overruns += 1
+                    deadline += int(late // self.period) * self.period
+                deadline += self.period
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                key.data.sock.close()
+        if self.listener is not None:
+            self.listener.close()
+        self.selector.close()
+
+
+def run_node(address, name, backend="system", rate=10.0, stop_event=None):
+    # Streams this machine's vectors to an aggregator, reconnecting on failure
+    stop_event = stop_event or threading.Event()
+    sampler = SystemSampler(backend)
+    scheduler = DeadlineScheduler(rate)
+    hello = json.dumps({"node": name, "width": len(sampler.fields())}).encode("utf-8") + b"\n"
+    try:
+        while not stop_event.is_set():
+            try:
+                sock = socket.create_connection(parse_address(address), timeout=5)
+            except OSError:
+                stop_event.wait(2.0)
+                continue
+            try:
+                sock.sendall(hello)
+                scheduler.reset()
+                while not stop_event.is_set():
+                    tick = scheduler.wait(stop_event)
+                    if tick is None:
+                        break
+                    sock.sendall(encode_frame(tick, sampler.get_system_vector()))
+            except OSError:
+                pass
+            finally:
+                sock.close()
+    finally:
+        sampler.close()
+
+
+def run_fake_nodes(address, count, rate=10.0, stop_event=None, prefix="fake"):
+    # Many simulated nodes from one thread: one socket and one fake sampler per node
+    stop_event = stop_event or threading.Event()
+    scheduler = DeadlineScheduler(rate)
+    nodes = []
+    for i in range(count):
+        sampler = SystemSampler("fake")
+        sock = socket.create_connection(parse_address(address))
+        sock.sendall(json.dumps({"node": f"{prefix}-{i}", "width": len(sampler.fields())}).encode("utf-8") + b"\n")
+        nodes.append((sock, sampler))
+    try:
+        while not stop_event.is_set():
+            tick = scheduler.wait(stop_event)
+            if tick is None:
+                break
+            for sock, sampler in nodes:
+                sock.sendall(encode_frame(tick, sampler.get_system_vector()))
+    except OSError:
+        pass
+    finally:
+        for sock, sampler in nodes:
+            sock.close()
+            sampler.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantum Anomaly Detector fleet mode")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    node = sub.add_parser("node", help="stream this machine's vectors to an aggregator")
+    node.add_argument("--connect", default=DEFAULT_ADDRESS, metavar="HOST:PORT")
+    node.add_argument("--name", default=socket.gethostname())
+    node.add_argument("--backend", default="system")
+    node.add_argument("--rate", type=float, default=10.0)
+
+    agg = sub.add_parser("aggregate", help="score many node streams at once")
+    agg.add_argument("--listen", default=DEFAULT_ADDRESS, metavar="HOST:PORT")
+    agg.add_argument("--rate", type=float, default=10.0, help="scoring ticks per second")
+    agg.add_argument("--method", choices=METHODS, default="Attractor")
+    agg.add_argument("--sensitivity", type=float, default=5.0)
+    agg.add_argument("--fleet-fraction", type=float, default=0.25,
+                     help="raise a fleet alert when this fraction of nodes is at ORANGE or above")
+    agg.add_argument("--fake-nodes", type=int, default=0, help="also run this many local fake nodes")
+    agg.add_argument("--duration", type=float, help="stop after this many seconds")
+    agg.add_argument("--verbose", action="store_true", help="print every node alert, not only fleet alerts")
+    args = parser.parse_args(argv)
+
+    if args.mode == "node":
+        print(f"Streaming to {args.connect} as {args.name}", flush=True)
+        try:
+            run_node(args.connect, args.name, args.backend, args.rate)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def on_alert(kind, detail):
+        if kind == "FLEET":
+            print(f"[{time.strftime('%H:%M:%S')}] FLEET ALERT! {detail['nodes']} of {detail['active']} nodes alerting", flush=True)
+        elif args.verbose:
+            print(f"[{time.strftime('%H:%M:%S')}] {kind} {detail['node']}: {detail['score']:.2f}", flush=True)
+
+    aggregator = FleetAggregator(args.listen, args.rate, args.method, args.sensitivity,
+                                 fleet_fraction=args.fleet_fraction, on_alert=on_alert)
+    host, port = aggregator.listen()
+    print(f"Aggregating on {host}:{port} | method {args.method}", flush=True)
+    stop_event = threading.Event()
+    if args.fake_nodes:
+        threading.Thread(target=run_fake_nodes, args=(f"{host}:{port}", args.fake_nodes, args.rate, stop_event),
+                         daemon=True).start()
+    t0 = time.perf_counter()
+    try:
+        aggregator.serve(stop_event, args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+    elapsed = time.perf_counter() - t0
+    aggregator.close()
+    print(f"  {len(aggregator.names)} nodes | {aggregator.ticks} ticks in {elapsed:.1f}s | overruns {aggregator.overruns} | "
+          f"coalesced {aggregator.coalesced} | rejected {aggregator.rejected}")
+    print("  " + "  ".join(f"{level}: {count}" for level, count in aggregator.counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
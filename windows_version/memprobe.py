@@ -0,0 +1,145 @@
+import time
+
+import numpy as np
+
+LINE_BYTES = 64
+# The floor chain loops on one word past CPython's small-int cache (-5..256), so
+# each hop allocates its result just like the hops of the real chains
+FLOOR_INDEX = 1024
+# Working sets that land in each level of a current desktop CPU (32-48 KB L1d,
+# 256 KB-2 MB L2, 6-32 MB L3); DRAM is sized past the largest common L3. The
+# L3-sized chain cannot be kept warm within the read budget (one lap is 65536
+# hops), so it reports how cold an L3-sized working set has gone between reads:
+# close to L3 latency on a quiet machine, up to DRAM latency once other work has
+# churned the shared cache.
+LEVELS = [
+    ("l1", 16 * 1024),
+    ("l2", 64 * 1024),
+    ("l3_cold", 4 * 1024 * 1024),
+    ("dram", 64 * 1024 * 1024),
+]
+
+
+def build_chain(size, seed=None):
+    # A uint32 buffer of `size` bytes in which the first word of every cache line
+    # holds the word index of the next line along one random cycle through all of
+    # them. Each load depends on the one before it and the order defeats the
+    # hardware prefetcher, so the time per hop is the latency of wherever the line
+    # currently lives.
+    words = LINE_BYTES // 4
+    lines = max(size // LINE_BYTES, 1)
+    chain = np.zeros(lines * words, dtype=np.uint32)
+    order = np.random.default_rng(seed).permutation(lines).astype(np.uint32) * words
+    chain[order] = np.roll(order, -1)
+    return chain
+
+
+def chase(chain, position, hops):
+    # Follows the chain for `hops` (a multiple of 8) dependent loads; unrolled so
+    # the loop itself is a small part of the per-hop interpreter cost
+    c = chain
+    i = position
+    for _ in range(hops >> 3):
+        i = c[c[c[c[c[c[c[c[i]]]]]]]]
+    return i
+
+
+class MemoryProbe:
+    # Per-level memory latency in nanoseconds per dependent load. Each level has its
+    # own pointer chain; hop counts are fixed at calibration so a read costs about
+    # `budget` seconds per level. The interpreter's cost per hop (the "floor") is
+    # measured on a one-word chain that never leaves L1 and subtracted, so the
+    # levels report the extra latency of the memory behind them. The floor is
+    # re-measured on every read and smoothed, which keeps the subtraction right when
+    # the clock speed changes. Chains of up to `warm_lines` lines are walked once
+    # before being timed so they are measured from their own level; the larger
+    # chains continue from where the last read stopped and so also measure how much
+    # of them other work has evicted since.
+    def __init__(self, levels=LEVELS, budget=10e-6, min_hops=128, max_hops=2048, warm_lines=1024,
+                 floor_alpha=0.1, seed=None):
+        self.levels = list(levels)
+        self.budget = budget
+        self.min_hops = min_hops
+        self.max_hops = max_hops
+        self.warm_lines = warm_lines
+        self.floor_alpha = floor_alpha
+        self.seed = seed
+        self.chains = []
+        self.positions = []
+        self.hops = []
+        self.floor_chain = None
+        self.floor_hops = 256
+        self.floor = 0.0
+        self.latest = [0.0] * len(self.levels)
+
+    @property
+    def names(self):
+        return [name for name, _ in self.levels]
+
+    def open(self):
+        rng = np.random.default_rng(self.seed)
+        # memoryview indexing returns a plain int with none of numpy's per-item overhead
+        self.chains = [memoryview(build_chain(size, rng.integers(2 ** 32))) for _, size in self.levels]
+        self.positions = [0] * len(self.chains)
+        floor_chain = np.zeros(FLOOR_INDEX + LINE_BYTES // 4, dtype=np.uint32)
+        floor_chain[FLOOR_INDEX] = FLOOR_INDEX
+        self.floor_chain = memoryview(floor_chain)
+        self.calibrate()
+        return self
+
+    def _per_hop(self, chain, position, hops):
+        t0 = time.perf_counter_ns()
+        position = chase(chain, position, hops)
+        return (time.perf_counter_ns() - t0) / hops, position
+
+    def _round(self, hops):
+        hops = int(min(max(hops, self.min_hops), self.max_hops))
+        return max(hops - hops % 8, 8)
+
+    def calibrate(self):
+        # Minimum of several floor runs, then size each level's hop count to the budget
+        # from the median of three trial runs. The trials continue from the end of the
+        # warm-up walk: a full lap for the chains read warm, lines not yet touched for
+        # the larger ones, so each is timed the way read() will find it.
+        floor_runs = [self._per_hop(self.floor_chain, FLOOR_INDEX, 4096)[0] for _ in range(5)]
+        self.floor = min(floor_runs)
+        self.hops = []
+        for k, chain in enumerate(self.chains):
+            lines = len(chain) * 4 // LINE_BYTES
+            self.positions[k] = chase(chain, 0, self._round(min(lines, self.max_hops)))
+            trials = []
+            for _ in range(3):
+                trial, self.positions[k] = self._per_hop(chain, self.positions[k], self._round(512))
+                trials.append(trial)
+            self.hops.append(self._round(self.budget * 1e9 / max(sorted(trials)[1], 1.0)))
+        self.read()
+
+    def read(self):
+        if not self.chains:
+            return list(self.latest)
+        # Largest first, so warming a small chain is the last thing before timing it
+        per_hop = [0.0] * len(self.chains)
+        for k in reversed(range(len(self.chains))):
+            chain = self.chains[k]
+            lines = len(chain) * 4 // LINE_BYTES
+            if lines <= self.warm_lines:
+                self.positions[k] = chase(chain, self.positions[k], self._round(lines))
+                if k == 0:
+                    # Timed here, with the loop already hot, rather than first thing
+                    # after the sampling thread wakes
+                    chase(self.floor_chain, FLOOR_INDEX, 64)
+                    floor, _ = self._per_hop(self.floor_chain, FLOOR_INDEX, self.floor_hops)
+                    self.floor += self.floor_alpha * (floor - self.floor)
+            per_hop[k], self.positions[k] = self._per_hop(chain, self.positions[k], self.hops[k])
+        self.latest = [max(ns - self.floor, 0.0) for ns in per_hop]
+        return list(self.latest)
+
+    def summary(self):
+        levels = " / ".join(f"{name.upper()} {ns:.1f}" for name, ns in zip(self.names, self.latest))
+        return f"{levels} ns (+{self.floor:.0f} ns floor)"
+
+    def close(self):
+        for chain in self.chains:
+            chain.release()
+        self.chains = []
+        self.floor_chain = None
@@ -0,0 +1,237 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds in seconds: 1 us to 10 s, four per decade
+BUCKETS = [1e-6 * 10 ** (i / 4) for i in range(29)]
+
+
+class Histogram:
+    # Fixed log-spaced buckets (the last one is +Inf), so observe() is a bisect and
+    # an increment and percentiles are read back to bucket resolution
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        total = 0
+        for i, n in enumerate(self.counts):
+            total += n
+            if total >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": list(self.counts),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = list(data["buckets"])
+        hist.count = data["count"]
+        hist.sum = data["sum"]
+        hist.max = data["max"]
+        return hist
+
+
+class Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    # Per-stage timing histograms, counters and gauges for the live pipeline. Gauges
+    # are callables sampled when a snapshot is taken, so queue depths and memory
+    # cost nothing between reads.
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(stage, Histogram())
+        hist.observe(seconds)
+
+    def time(self, stage):
+        return Timer(self, stage)
+
+    def inc(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def load(self, snapshot, prefix):
+        # Mirrors another process's snapshot (e.g. the sampling worker) under `prefix`
+        with self.lock:
+            for stage, data in snapshot.get("histograms", {}).items():
+                self.histograms[prefix + stage] = Histogram.from_dict(data)
+        for name, value in snapshot.get("counters", {}).items():
+            self.counters[prefix + name] = value
+        for name, value in snapshot.get("gauges", {}).items():
+            self.gauges[prefix + name] = (lambda value=value: value)
+
+    def read_gauges(self):
+        values = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                values[name] = float(read())
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self):
+        with self.lock:
+            histograms = {stage: hist.to_dict() for stage, hist in self.histograms.items()}
+        return {
+            "histograms": histograms,
+            "counters": dict(self.counters),
+            "gauges": self.read_gauges(),
+        }
+
+    def prometheus(self):
+        snap = self.snapshot()
+        lines = ["# TYPE quantum_stage_seconds histogram"]
+        for stage, data in sorted(snap["histograms"].items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + [float("inf")], data["buckets"]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:.6g}"
+                lines.append(f'quantum_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'quantum_stage_seconds_sum{{stage="{stage}"}} {data["sum"]:.9g}')
+            lines.append(f'quantum_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+        for name, value in sorted(snap["counters"].items()):
+            metric = "quantum_" + name.replace(".", "_")
+            lines.append(f"# TYPE {metric}_total counter")
+            lines.append(f"{metric}_total {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            metric = "quantum_" + name.replace(".", "_")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        # Plain-text table for the diagnostics panel
+        snap = self.snapshot()
+        lines = [f"{'stage':<22}{'count':>9}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for stage, data in sorted(snap["histograms"].items()):
+            lines.append(f"{stage:<22}{data['count']:>9}{data['mean'] * 1e6:>10.1f}{data['p50'] * 1e6:>10.1f}"
+                         f"{data['p99'] * 1e6:>10.1f}{data['max'] * 1e6:>10.1f}")
+        lines.append("")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"{name:<32}{value:>12}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"{name:<32}{value:>12.6g}")
+        return "\n".join(lines)
+
+
+def rss_bytes():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+class StartupProfile:
+    # Wall time per startup phase; mark() closes the phase that started at the
+    # previous mark, add() records work that ran concurrently (e.g. a background thread)
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.last = self.t0
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.t0))
+        self.last = now
+
+    def add(self, phase, seconds):
+        self.phases.append((phase, seconds, time.perf_counter() - self.t0))
+
+    def summary(self):
+        return [f"{phase} {seconds * 1000:.0f} ms" for phase, seconds, _ in self.phases]
+
+    def report(self):
+        lines = [f"{'startup phase':<30}{'ms':>9}{'at ms':>9}"]
+        for phase, seconds, at in self.phases:
+            lines.append(f"{phase:<30}{seconds * 1000:>9.1f}{at * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+class MetricsServer:
+    # Localhost HTTP endpoint: /metrics serves Prometheus text, /metrics.json JSON
+    def __init__(self, metrics, port=9108, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(metrics_ref.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = metrics_ref.prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
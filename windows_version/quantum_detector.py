@@ -1,23 +1,35 @@
+import time
+STARTUP_T0 = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
-import psutil
-import time
-import math
 import random
 import threading
 from collections import deque
-import numpy as np
-import pynvml
-import csv
 import datetime
 import os
+import sys
 import json
-import winsound
-from scipy import fft, stats
+import atexit
+from detector_engine import DetectorEngine, ResultQueue, SystemSampler, METHODS, PRESETS
+from scheduler import DeadlineScheduler
+from alerts import AlertDispatcher, AlertGate
+from anomaly_writer import AnomalyWriter
+from rendering import WaveformRenderer, SpectrumRenderer
+from datalog import DataLog
+from metrics import Metrics, MetricsServer, StartupProfile, rss_bytes
+from session_file import (SessionCheckpointer, load_session_file, recover_checkpoint, session_history,
+                          write_session)
+
+TIMESCALES = {"1min": 60, "5min": 300, "15min": 900, "1hr": 3600}
+SAMPLE_RATES = ["10", "50", "100", "250", "500", "1000"]
+DEFAULT_SWITCH_INTERVAL = sys.getswitchinterval()
+CHECKPOINT_PATH = "session-checkpoint.qds"
 
 class QuantumDetectorApp:
-    def __init__(self, root):
+    def __init__(self, root, frame_rate=20, backend="system", sample_rate=10.0, worker_process=False, pin_core=None,
+                 metrics_port=None, profile=None):
         self.root = root
+        self.profile = profile
         self.root.title("Quantum Anomaly Detector - PRO Edition v3.0")
         self.root.geometry("1400x900")
         
@@ -30,26 +42,72 @@ class QuantumDetectorApp:
         self.ram_info_var = tk.StringVar(value="RAM: Detecting...")
         self.sensitivity_label_var = tk.StringVar(value="Sensitivity: 5.00")
         self.timescale_var = tk.StringVar(value="5min")
+        # Plain copy for the checkpointer thread, which must not touch Tk variables
+        self.timescale = self.timescale_var.get()
         self.detection_method_var = tk.StringVar(value="Attractor")
         self.theme_var = tk.StringVar(value="Dark")
+        self.sample_rate_var = tk.StringVar(value=f"{sample_rate:g}")
         
         self.sensitivity = 5.0
         self.running = True
         self.logging_enabled = tk.BooleanVar(value=False)
         self.audio_enabled = tk.BooleanVar(value=True)
+        # Plain copies of the two toggles read by the alert dispatcher's thread
+        self.logging_on = self.logging_enabled.get()
+        self.audio_on = self.audio_enabled.get()
         self.always_on_top = tk.BooleanVar(value=False)
         self.auto_calibrate = tk.BooleanVar(value=False)
         
-        # Thresholds for multi-level alerts
-        self.threshold_yellow = 3.0
-        self.threshold_orange = 5.0
-        self.threshold_red = 8.0
+        # Detection engine (scoring, thresholds and history live here); sampling runs
+        # against absolute deadlines and history is sized from the measured rate.
+        # With worker_process, sampling and scoring run in their own process and this
+        # one only reads the results from shared memory.
+        self.worker_process = worker_process
+        self.metrics = Metrics()
+        history_len = int(TIMESCALES[self.timescale_var.get()] * sample_rate)
+        if worker_process:
+            from worker import ProcessEngine
+            self.scheduler = None
+            self.engine = ProcessEngine(backend, self.detection_method_var.get(), self.sensitivity,
+                                        history_len=history_len, sample_rate=sample_rate, core=pin_core,
+                                        metrics=self.metrics)
+        else:
+            self.scheduler = DeadlineScheduler(sample_rate)
+            self.set_switch_interval()
+            self.engine = DetectorEngine(self.detection_method_var.get(), self.sensitivity,
+                                         history_len=history_len, sample_rate=sample_rate, metrics=self.metrics)
+        
+        # Samples are handed to the UI through a bounded queue drained once per frame
+        self.results = ResultQueue(maxlen=1024)
+        self.frame_rate = frame_rate
+        self.coalesced = 0
         
         # Data storage
-        self.history = deque(maxlen=600)  # 10 min at 10Hz
-        self.attractor_history = deque(maxlen=50)
         self.alert_history = deque(maxlen=20)
-        self.full_data_log = []
+        self.data_log = DataLog(ram_rows=100000)  # older rows spill to a memory-mapped file
+        atexit.register(self.data_log.close)
+        self.anomaly_writer = AnomalyWriter("anomalies.csv", formats=("csv", "bin"), rotate_bytes=64 * 1024 * 1024,
+                                            metrics=self.metrics)
+        atexit.register(self.anomaly_writer.close)
+        
+        # Alerts run through one dispatcher thread: the anomaly file gets every
+        # alerting sample, while sound, the log and the alert list get one event per
+        # anomaly (held through brief dips, rate limited)
+        self.max_log_lines = 2000
+        self.alerts = AlertDispatcher(AlertGate(thresholds=self.engine.thresholds), metrics=self.metrics)
+        self.alerts.subscribe(self.log_anomaly_csv, samples=True)
+        self.alerts.subscribe(self.on_alert_event)
+        self.alerts.subscribe(self.play_alert_sound)
+        atexit.register(self.alerts.close)
+        
+        # Crash safety: new log rows are appended to a checkpoint file in the background.
+        # A checkpoint left by a run that did not close normally is renamed first and
+        # offered for loading.
+        self.recovered_checkpoint = recover_checkpoint(CHECKPOINT_PATH)
+        self.checkpointer = SessionCheckpointer(CHECKPOINT_PATH, self.data_log, self.session_meta, interval=10.0)
+        self.checkpointer.start()
+        atexit.register(self.checkpointer.stop)
+        self.mark("engine and stores")
         
         # Themes
         self.themes = {
@@ -58,43 +116,72 @@ class QuantumDetectorApp:
         }
         self.current_theme = self.themes["Dark"]
         
-        # Hardware Init
-        self.init_gpu()
-        self.init_ram_buffer()
+        # Hardware is probed (NVML init, RAM probe buffer, worker process) in the
+        # background once the window is up; see start_hardware
+        if worker_process:
+            self.sampler = self.engine
+            atexit.register(self.engine.close)
+        else:
+            self.sampler = SystemSampler(backend, metrics=self.metrics, start=False)
+            atexit.register(self.sampler.close)
         
         # UI
         self.apply_theme()
         self.create_widgets()
+        self.mark("widgets")
         
-        # Start Thread
-        self.thread = threading.Thread(target=self.update_loop, daemon=True)
-        self.thread.start()
-        
-        self.log_message("System Initialized. All sensors active.", "info")
+        # Diagnostics: queue depths and memory are read whenever metrics are viewed
+        self.metrics.gauge("queue.results", lambda: len(self.results))
+        self.metrics.gauge("queue.writer", self.anomaly_writer.queue.qsize)
+        self.metrics.gauge("queue.alerts", self.alerts.queue.qsize)
+        self.metrics.gauge("rss_bytes", rss_bytes)
+        self.metrics.gauge("ui.coalesced", lambda: self.coalesced)
+        self.metrics.gauge("sample_rate_hz", self.engine.measured_rate)
+        for name in ("overruns", "skipped", "dropped"):
+            self.metrics.gauge(f"sampling.{name}", lambda name=name: self.sampling_stats()[name])
+        self.metrics_server = MetricsServer(self.metrics, metrics_port).start() if metrics_port else None
+        self.diagnostics_text = None
         
         # Auto-calibration timer
         self.last_calibration = time.time()
-
-    def init_gpu(self):
+        
+        self.first_result = True
+        self.root.after_idle(self.start_hardware)
+        if self.recovered_checkpoint:
+            self.root.after_idle(self.offer_recovery)
+        
+        # Spectrum refreshes on its own timer, not once per sample
+        self.fft_refresh_ms = 500
+        self.fft_version = -1
+        self.root.after(self.fft_refresh_ms, self.refresh_fft)
+        self.root.after(int(1000 / self.frame_rate), self.refresh_ui)
+
+    def mark(self, phase):
+        if self.profile is not None:
+            self.profile.mark(phase)
+
+    def start_hardware(self):
+        self.mark("window shown")
+        threading.Thread(target=self.init_hardware, daemon=True).start()
+
+    def init_hardware(self):
+        start = time.perf_counter()
         try:
-            pynvml.nvmlInit()
-            self.gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-            name = pynvml.nvmlDeviceGetName(self.gpu_handle)
-            if isinstance(name, bytes):
-                name = name.decode('utf-8')
-            self.gpu_info_var.set(f"GPU: {name}")
-            self.gpu_active = True
+            self.sampler.start()
         except Exception as e:
-            self.gpu_info_var.set(f"GPU: Error")
-            self.gpu_active = False
-
-    def init_ram_buffer(self):
-        try:
-            self.ram_buffer = np.zeros(50 * 1024 * 1024, dtype=np.uint8)
-            self.ram_info_var.set("RAM: 64GB System")
-        except:
-            self.ram_info_var.set("RAM: Buffer Failed")
-            self.ram_buffer = None
+            self.root.after(0, self.log_message, f"Sensor startup failed: {e}", "warn")
+            return
+        if self.profile is not None:
+            self.profile.add("hardware init (background)", time.perf_counter() - start)
+        self.root.after(0, self.on_hardware_ready)
+
+    def on_hardware_ready(self):
+        self.gpu_info_var.set(self.sampler.gpu_info)
+        self.ram_info_var.set(self.sampler.ram_info)
+        if not self.worker_process:
+            self.thread = threading.Thread(target=self.update_loop, daemon=True)
+            self.thread.start()
+        self.log_message("System Initialized. All sensors active.", "info")
 
     def apply_theme(self):
         theme = self.themes[self.theme_var.get()]
@@ -174,6 +261,8 @@ class QuantumDetectorApp:
         fft_frame.pack(fill="both", expand=True, pady=3)
         self.fft_canvas = tk.Canvas(fft_frame, bg=theme["canvas_bg"], height=200, highlightthickness=1, highlightbackground="#333")
         self.fft_canvas.pack(fill="both", expand=True, padx=5, pady=5)
+        self.wave_renderer = WaveformRenderer(self.canvas)
+        self.fft_renderer = SpectrumRenderer(self.fft_canvas)
 
         # Controls
         controls = ttk.LabelFrame(right, text="Controls & Configuration")
@@ -181,8 +270,9 @@ class QuantumDetectorApp:
 
         # Detection Method
         tk.Label(controls, text="Detection Method:", bg=theme["bg"], fg=theme["fg"]).grid(row=0, column=0, sticky="w", padx=5)
-        method_combo = ttk.Combobox(controls, textvariable=self.detection_method_var, values=["Attractor", "Z-Score", "IQR", "MAD"], state="readonly", width=12)
+        method_combo = ttk.Combobox(controls, textvariable=self.detection_method_var, values=METHODS, state="readonly", width=12)
         method_combo.grid(row=0, column=1, sticky="w", padx=5)
+        method_combo.bind("<<ComboboxSelected>>", self.change_method)
 
         # Time Scale
         tk.Label(controls, text="Time Scale:", bg=theme["bg"], fg=theme["fg"]).grid(row=0, column=2, sticky="w", padx=5)
@@ -190,6 +280,12 @@ class QuantumDetectorApp:
         scale_combo.grid(row=0, column=3, sticky="w", padx=5)
         scale_combo.bind("<<ComboboxSelected>>", self.change_timescale)
 
+        # Sample Rate
+        tk.Label(controls, text="Rate (Hz):", bg=theme["bg"], fg=theme["fg"]).grid(row=1, column=2, sticky="w", padx=5, pady=(5,0))
+        rate_combo = ttk.Combobox(controls, textvariable=self.sample_rate_var, values=SAMPLE_RATES, state="readonly", width=8)
+        rate_combo.grid(row=1, column=3, sticky="w", padx=5, pady=(5,0))
+        rate_combo.bind("<<ComboboxSelected>>", self.change_rate)
+
         # Sensitivity
         tk.Label(controls, textvariable=self.sensitivity_label_var, bg=theme["bg"], fg=theme["fg"]).grid(row=1, column=0, columnspan=2, sticky="w", padx=5, pady=(5,0))
         self.slider = ttk.Scale(controls, from_=1.0, to=15.0, orient="horizontal", command=self.update_sensitivity)
@@ -206,12 +302,13 @@ class QuantumDetectorApp:
         ttk.Button(btn_frame, text="Save Session", command=self.save_session, width=12).pack(side="left", padx=2)
         ttk.Button(btn_frame, text="Load Session", command=self.load_session, width=12).pack(side="left", padx=2)
         ttk.Button(btn_frame, text="Presets", command=self.show_presets, width=10).pack(side="left", padx=2)
+        ttk.Button(btn_frame, text="Diagnostics", command=self.show_diagnostics, width=12).pack(side="left", padx=2)
 
         # Options
         opt_frame = tk.Frame(controls, bg=theme["bg"])
         opt_frame.grid(row=4, column=0, columnspan=4, sticky="w", padx=5)
-        ttk.Checkbutton(opt_frame, text="Log to CSV", variable=self.logging_enabled).pack(side="left", padx=3)
-        ttk.Checkbutton(opt_frame, text="Audio Alerts", variable=self.audio_enabled).pack(side="left", padx=3)
+        ttk.Checkbutton(opt_frame, text="Log to CSV", variable=self.logging_enabled, command=self.sync_toggles).pack(side="left", padx=3)
+        ttk.Checkbutton(opt_frame, text="Audio Alerts", variable=self.audio_enabled, command=self.sync_toggles).pack(side="left", padx=3)
         ttk.Checkbutton(opt_frame, text="Always On Top", variable=self.always_on_top, command=self.toggle_always_on_top).pack(side="left", padx=3)
         ttk.Checkbutton(opt_frame, text="Auto-Cal (5min)", variable=self.auto_calibrate).pack(side="left", padx=3)
         ttk.Button(opt_frame, text="Theme", command=self.toggle_theme, width=8).pack(side="left", padx=3)
@@ -222,6 +319,10 @@ class QuantumDetectorApp:
     def log_message(self, message, tag="info"):
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n", tag)
+        # Every message ends in a newline, so the (empty) last line is messages + 1
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - self.max_log_lines
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see(tk.END)
 
     def add_alert(self, score, level="RED"):
@@ -234,26 +335,49 @@ class QuantumDetectorApp:
 
     def update_sensitivity(self, val):
         self.sensitivity = float(val)
-        self.threshold_orange = self.sensitivity
-        self.threshold_yellow = self.sensitivity * 0.6
-        self.threshold_red = self.sensitivity * 1.6
+        self.engine.set_sensitivity(self.sensitivity)
         self.sensitivity_label_var.set(f"Sensitivity: {self.sensitivity:.2f}")
 
+    def change_method(self, event=None):
+        self.engine.set_method(self.detection_method_var.get())
+        self.alerts.reset()
+
     def change_timescale(self, event=None):
-        scales = {"1min": 60, "5min": 300, "15min": 900, "1hr": 3600}
-        maxlen = scales[self.timescale_var.get()] // 0.1  # 10Hz sampling
-        self.history = deque(list(self.history)[-int(maxlen):], maxlen=int(maxlen))
+        self.timescale = self.timescale_var.get()
+        self.engine.resize_history(self.engine.samples_for(TIMESCALES[self.timescale]))
+
+    def sync_history_length(self):
+        # Follow the measured rate, ignoring small drift so the ring is rarely rebuilt
+        maxlen = self.engine.samples_for(TIMESCALES[self.timescale])
+        if abs(maxlen - self.engine.history.maxlen) > 0.05 * self.engine.history.maxlen:
+            self.engine.resize_history(maxlen)
+
+    def change_rate(self, event=None):
+        rate = float(self.sample_rate_var.get())
+        if self.scheduler is not None:
+            self.scheduler.set_rate(rate)
+            self.set_switch_interval()
+        self.engine.set_sample_rate(rate)
+        self.change_timescale()
+        self.log_message(f"Sample rate set to {rate:g} Hz", "info")
+
+    def set_switch_interval(self):
+        # The in-process sampler shares the GIL with Tk; a holder keeps it for up to
+        # the switch interval (5 ms by default), longer than a period above 200 Hz
+        sys.setswitchinterval(min(DEFAULT_SWITCH_INTERVAL, 1.0 / (4 * self.scheduler.rate)))
 
     def toggle_scanning(self):
         self.running = not self.running
+        if self.worker_process:
+            self.engine.pause(not self.running)
         self.toggle_btn.config(text="Resume" if not self.running else "Pause")
         self.log_message("Scanning " + ("Paused" if not self.running else "Resumed"), "warn")
 
     def calibrate(self):
-        self.attractor_history.clear()
-        self.history.clear()
-        self.canvas.delete("all")
-        self.fft_canvas.delete("all")
+        self.engine.calibrate()
+        self.alerts.reset()
+        self.wave_renderer.clear()
+        self.fft_renderer.clear()
         self.last_calibration = time.time()
         self.log_message("Zero Point Calibrated", "warn")
 
@@ -261,51 +385,83 @@ class QuantumDetectorApp:
         self.root.attributes('-topmost', self.always_on_top.get())
 
     def toggle_theme(self):
+        old = self.current_theme
         self.theme_var.set("Light" if self.theme_var.get() == "Dark" else "Dark")
         self.current_theme = self.themes[self.theme_var.get()]
         self.apply_theme()
-        self.root.destroy()
-        self.__init__(tk.Tk())
+        self.restyle(self.root, {old[key]: self.current_theme[key] for key in old})
+
+    def restyle(self, widget, colors):
+        # Swap theme colours on the classic Tk widgets in place; ttk widgets follow
+        # the styles set by apply_theme
+        for option in ("bg", "fg"):
+            try:
+                value = widget.cget(option)
+            except tk.TclError:
+                continue
+            if value in colors:
+                widget.configure({option: colors[value]})
+        for child in widget.winfo_children():
+            self.restyle(child, colors)
+
+    def session_meta(self):
+        return {
+            "alerts": list(self.alert_history),
+            "config": {
+                "sensitivity": self.sensitivity,
+                "method": self.engine.method,
+                "timescale": self.timescale
+            }
+        }
 
     def save_session(self):
-        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        filename = filedialog.asksaveasfilename(defaultextension=".qds", filetypes=[("Session", "*.qds")])
         if filename:
-            data = {
-                "history": list(self.history),
-                "alerts": list(self.alert_history),
-                "config": {
-                    "sensitivity": self.sensitivity,
-                    "method": self.detection_method_var.get(),
-                    "timescale": self.timescale_var.get()
-                }
-            }
-            with open(filename, 'w') as f:
-                json.dump(data, f)
-            self.log_message(f"Session saved: {os.path.basename(filename)}", "info")
+            meta = self.session_meta()
+            history = self.engine.snapshot().copy()
+            threading.Thread(target=self.write_session_file, args=(filename, meta, history), daemon=True).start()
+
+    def write_session_file(self, filename, meta, history):
+        try:
+            write_session(filename, meta, history, self.data_log)
+            self.root.after(0, self.log_message, f"Session saved: {os.path.basename(filename)}", "info")
+        except OSError as e:
+            self.root.after(0, self.log_message, f"Session save failed: {e}", "warn")
 
     def load_session(self):
-        filename = filedialog.askopenfilename(filetypes=[("JSON", "*.json")])
+        filename = filedialog.askopenfilename(filetypes=[("Session", "*.qds"), ("JSON", "*.json")])
         if filename:
+            self.load_session_path(filename)
+
+    def load_session_path(self, filename):
+        if filename.lower().endswith(".json"):
             with open(filename, 'r') as f:
                 data = json.load(f)
-            self.history = deque(data["history"], maxlen=self.history.maxlen)
-            self.alert_history = deque(data["alerts"], maxlen=20)
-            self.sensitivity = data["config"]["sensitivity"]
-            self.slider.set(self.sensitivity)
-            self.log_message(f"Session loaded: {os.path.basename(filename)}", "info")
+            history = data["history"]
+        else:
+            data, arrays = load_session_file(filename)
+            history = session_history(arrays, self.engine.history.maxlen)
+        self.engine.load_history(history)
+        self.alert_history = deque(data.get("alerts", []), maxlen=20)
+        self.sensitivity = data.get("config", {}).get("sensitivity", self.sensitivity)
+        self.slider.set(self.sensitivity)
+        self.log_message(f"Session loaded: {os.path.basename(filename)}", "info")
+
+    def offer_recovery(self):
+        name = os.path.basename(self.recovered_checkpoint)
+        self.log_message(f"Checkpoint from the previous run kept as {name}", "warn")
+        if messagebox.askyesno("Recover Session", f"The previous run left a checkpoint, saved as {name}.\n\nLoad it now?"):
+            try:
+                self.load_session_path(self.recovered_checkpoint)
+            except (OSError, ValueError) as e:
+                self.log_message(f"Session load failed: {e}", "warn")
 
     def show_presets(self):
         preset_win = tk.Toplevel(self.root)
         preset_win.title("Preset Profiles")
         preset_win.geometry("300x200")
         
-        presets = {
-            "High Sensitivity": 2.0,
-            "Balanced": 5.0,
-            "Low Noise": 10.0
-        }
-        
-        for name, value in presets.items():
+        for name, value in PRESETS.items():
             btn = ttk.Button(preset_win, text=name, command=lambda v=value: self.apply_preset(v, preset_win))
             btn.pack(pady=5, padx=20, fill="x")
 
@@ -314,175 +470,78 @@ class QuantumDetectorApp:
         self.log_message(f"Preset applied: Sensitivity={value:.1f}", "info")
         window.destroy()
 
-    # Hardware methods
-    def get_gpu_entropy(self):
-        if not self.gpu_active:
-            return 0, 0
-        try:
-            temp = pynvml.nvmlDeviceGetTemperature(self.gpu_handle, pynvml.NVML_TEMPERATURE_GPU)
-            power = pynvml.nvmlDeviceGetPowerUsage(self.gpu_handle)
-            return temp, power
-        except:
-            return 0, 0
-
-    def get_ram_jitter(self):
-        if self.ram_buffer is None:
-            return 0
-        idx = np.random.randint(0, len(self.ram_buffer), 1000)
-        t0 = time.perf_counter_ns()
-        _ = self.ram_buffer[idx]
-        t1 = time.perf_counter_ns()
-        return (t1 - t0)
-
-    def get_system_vector(self):
-        cpu = psutil.cpu_percent(interval=None)
-        ram = psutil.virtual_memory().percent
-        gpu_temp, gpu_power = self.get_gpu_entropy()
-        ram_jitter = self.get_ram_jitter()
-        time_jitter = (time.perf_counter() * 1000000) % 100
-        return [cpu, ram, gpu_temp, gpu_power / 1000.0, ram_jitter / 1000.0, time_jitter]
-
-    def calculate_shannon_entropy(self, data):
-        entropy = 0
-        for x in data:
-            if x > 0:
-                val = (x % 100) / 100.0
-                if val > 0:
-                    entropy -= val * math.log(val)
-        return abs(entropy)
-
-    def calculate_anomaly_score(self, vector):
-        method = self.detection_method_var.get()
-        
-        if method == "Attractor":
-            self.attractor_history.append(vector)
-            if len(self.attractor_history) < 2:
-                return 0
-            centroid = np.mean(self.attractor_history, axis=0)
-            return np.linalg.norm(np.array(vector) - centroid)
-        
-        elif method == "Z-Score":
-            if len(self.history) < 10:
-                return 0
-            recent = list(self.history)[-30:]
-            mean = np.mean(recent)
-            std = np.std(recent)
-            if std == 0:
-                return 0
-            current = np.linalg.norm(vector)
-            return abs((current - mean) / std)
-        
-        elif method == "IQR":
-            if len(self.history) < 10:
-                return 0
-            recent = list(self.history)[-50:]
-            q1, q3 = np.percentile(recent, [25, 75])
-            iqr = q3 - q1
-            current = np.linalg.norm(vector)
-            if current < q1 - 1.5 * iqr or current > q3 + 1.5 * iqr:
-                return abs(current - np.median(recent))
-            return 0
-        
-        elif method == "MAD":
-            if len(self.history) < 10:
-                return 0
-            recent = list(self.history)[-50:]
-            median = np.median(recent)
-            mad = np.median([abs(x - median) for x in recent])
-            current = np.linalg.norm(vector)
-            if mad == 0:
-                return 0
-            return abs((current - median) / (1.4826 * mad))
-        
-        return 0
-
-    def calculate_zscore(self):
-        if len(self.history) < 10:
-            return 0
-        recent = list(self.history)[-50:]
-        mean = np.mean(recent)
-        std = np.std(recent)
-        if std == 0:
-            return 0
-        return (self.history[-1] - mean) / std
-
-    def draw_waveform(self):
-        self.canvas.delete("all")
-        w = self.canvas.winfo_width()
-        h = self.canvas.winfo_height()
-        
-        if len(self.history) < 2:
+    def show_diagnostics(self):
+        if self.diagnostics_text is not None:
+            self.diagnostics_text.winfo_toplevel().lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Pipeline Diagnostics")
+        window.geometry("640x480")
+        self.diagnostics_text = tk.Text(window, bg=self.current_theme["canvas_bg"], fg="#00FF00", font=("Consolas", 9))
+        self.diagnostics_text.pack(fill="both", expand=True)
+
+        def close():
+            self.diagnostics_text = None
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", close)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if self.diagnostics_text is None:
             return
+        self.diagnostics_text.delete("1.0", tk.END)
+        self.diagnostics_text.insert("1.0", self.metrics.report())
+        self.root.after(1000, self.refresh_diagnostics)
 
-        # Expected range shading
-        if len(self.history) > 20:
-            recent = list(self.history)
-            mean = np.mean(recent)
-            std = np.std(recent)
-            upper = mean + 2 * std
-            lower = mean - 2 * std
-            max_val = 20.0
-            
-            y_upper = h - (min(upper, max_val) / max_val) * h
-            y_lower = h - (min(lower, max_val) / max_val) * h
-            self.canvas.create_rectangle(0, y_upper, w, y_lower, fill="#004400", outline="")
-
-        # Grid
-        self.canvas.create_line(0, h/2, w, h/2, fill="#333", dash=(2, 4))
-        
-        # Waveform
-        max_val = 20.0
-        step = w / len(self.history)
-        points = []
-        for i, val in enumerate(self.history):
-            x = i * step
-            y = h - (min(val, max_val) / max_val) * h
-            points.extend([x, y])
-
-        if len(points) >= 4:
-            color = "#00FF00"
-            if self.history[-1] > self.threshold_red:
-                color = "#FF0000"
-            elif self.history[-1] > self.threshold_orange:
-                color = "#FF8800"
-            elif self.history[-1] > self.threshold_yellow:
-                color = "#FFFF00"
-            
-            self.canvas.create_line(points, fill=color, width=2)
+    def sampling_stats(self):
+        if self.worker_process:
+            return self.engine.stats()
+        return dict(self.scheduler.stats(), dropped=self.results.dropped)
+
+    def draw_waveform(self):
+        history, position, mean, std = self.engine.waveform()
+        self.wave_renderer.draw(history, self.engine.threshold_yellow, self.engine.threshold_orange, self.engine.threshold_red,
+                                position, mean, std)
+
+    def refresh_fft(self):
+        self.sync_history_length()
+        if self.engine.spectrum.version != self.fft_version:
+            self.fft_version = self.engine.spectrum.version
+            with self.metrics.time("draw_fft"):
+                self.draw_fft()
+        self.root.after(self.fft_refresh_ms, self.refresh_fft)
 
     def draw_fft(self):
-        self.fft_canvas.delete("all")
-        w = self.fft_canvas.winfo_width()
-        h = self.fft_canvas.winfo_height()
-        
-        if len(self.history) < 32:
+        if len(self.engine.spectrum) == 0:
+            self.fft_renderer.clear()
             return
 
-        # Perform FFT
-        data = np.array(list(self.history))
-        fft_result = np.abs(fft.rfft(data))
-        freqs = fft.rfftfreq(len(data), d=0.1)  # 10Hz sampling
-        
-        # Draw bars
-        n_bins = min(50, len(fft_result))
-        bar_width = w / n_bins
-        max_magnitude = np.max(fft_result[1:]) if len(fft_result) > 1 else 1
-        
-        for i in range(1, n_bins):
-            if i >= len(fft_result):
-                break
-            magnitude = fft_result[i]
-            bar_height = (magnitude / max_magnitude) * h * 0.9
-            x = i * bar_width
-            y = h - bar_height
-            
-            color = "#00FF00" if magnitude < max_magnitude * 0.7 else "#FFFF00"
-            self.fft_canvas.create_rectangle(x, y, x + bar_width - 1, h, fill=color, outline="")
-
-    def play_alert_sound(self, level):
-        if not self.audio_enabled.get():
+        # Welch estimate maintained incrementally by the engine
+        freqs, magnitude = self.engine.get_spectrum()
+        self.fft_renderer.draw(freqs, magnitude)
+
+    def on_alert_event(self, event):
+        # Called on the dispatcher thread; the widgets are updated on Tk's
+        self.root.after(0, self.show_alert_event, event)
+
+    def show_alert_event(self, event):
+        level = event["level"]
+        if event["kind"] == "alert":
+            self.add_alert(event["score"], level)
+            self.log_message(f"{level} ALERT! Score: {event['score']:.2f}", "alert")
+        else:
+            self.log_message(f"{level} alert cleared after {event['duration']:.1f}s (peak {event['score']:.2f})",
+                             "info")
+
+    def play_alert_sound(self, event):
+        if event["kind"] != "alert" or not self.audio_on:
             return
+        level = event["level"]
         
+        try:
+            import winsound
+        except ImportError:
+            return
         try:
             if level == "RED":
                 winsound.Beep(1000, 200)
@@ -493,74 +552,101 @@ class QuantumDetectorApp:
         except:
             pass
 
-    def log_anomaly_csv(self, deviation, vector):
-        if not self.logging_enabled.get():
+    def sync_toggles(self):
+        self.logging_on = self.logging_enabled.get()
+        self.audio_on = self.audio_enabled.get()
+
+    def log_anomaly_csv(self, result):
+        if not self.logging_on:
             return
         
-        file_exists = os.path.isfile("anomalies.csv")
-        with open("anomalies.csv", "a", newline="") as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Deviation", "Z-Score", "Vector"])
-            zscore = self.calculate_zscore()
-            writer.writerow([datetime.datetime.now(), deviation, zscore, str(vector)])
+        self.anomaly_writer.put(result)
 
     def update_loop(self):
         while True:
-            if self.running:
-                # Auto-calibration
-                if self.auto_calibrate.get() and (time.time() - self.last_calibration) > 300:
-                    self.root.after(0, self.calibrate)
-                
-                vector = self.get_system_vector()
-                entropy = self.calculate_shannon_entropy(vector)
-                deviation = self.calculate_anomaly_score(vector)
-                
-                self.root.after(0, self.update_ui, entropy, deviation, vector)
-            
-            time.sleep(0.1)
-
-    def update_ui(self, entropy, deviation, vector):
-        self.entropy_var.set(f"{entropy:.4f}")
-        self.anomaly_var.set(f"{deviation:.2f}")
+            if not self.running:
+                # Deadlines restart on resume instead of counting the pause as overruns
+                self.scheduler.reset()
+                time.sleep(0.1)
+                continue
+
+            tick = self.scheduler.wait()
+            with self.metrics.time("sample"):
+                vector = self.sampler.get_system_vector()
+            with self.metrics.time("process"):
+                result = self.engine.process(vector, datetime.datetime.fromtimestamp(tick))
+
+            self.results.put(result)
+
+    def refresh_ui(self):
+        batch = self.engine.poll() if self.worker_process else self.results.drain()
+        if batch:
+            with self.metrics.time("update_ui"):
+                self.update_ui(batch)
+        self.root.after(int(1000 / self.frame_rate), self.refresh_ui)
+
+    def update_ui(self, batch):
+        if self.first_result:
+            self.first_result = False
+            if self.profile is not None:
+                self.mark("first sample")
+                report = self.profile.report()
+                print(report, flush=True)
+                self.log_message("Startup profile: " + " | ".join(self.profile.summary()), "info")
         
-        zscore = self.calculate_zscore()
-        self.zscore_var.set(f"{zscore:.2f}")
+        # Every sample is logged and passed to the alert dispatcher; only the newest one is displayed
+        for result in batch:
+            with self.metrics.time("data_log"):
+                self.data_log.append(result)
+            # Quiet samples too, so the dispatcher can see an anomaly end
+            self.alerts.put(result)
         
-        self.history.append(deviation)
-        self.full_data_log.append({
-            "time": datetime.datetime.now().isoformat(),
-            "entropy": entropy,
-            "deviation": deviation,
-            "zscore": zscore,
-            "vector": vector
-        })
+        result = batch[-1]
+        deviation = result["deviation"]
+        self.entropy_var.set(f"{result['entropy']:.4f}")
+        self.anomaly_var.set(f"{deviation:.2f}")
+        self.zscore_var.set(f"{result['zscore']:.2f}")
+        self.coalesced += len(batch) - 1
+        stats = self.sampling_stats()
+        self.status_var.set(f"Scanning {self.engine.measured_rate():.0f} Hz | overruns {stats['overruns']} "
+                            f"(skipped {stats['skipped']}) | dropped {stats['dropped']} | coalesced {self.coalesced}")
+
+        # Auto-calibration, timed by sample timestamps
+        if self.auto_calibrate.get() and result["time"].timestamp() - self.last_calibration > 300:
+            self.calibrate()
         
-        self.draw_waveform()
-        self.draw_fft()
+        with self.metrics.time("draw_waveform"):
+            self.draw_waveform()
 
         # Multi-threshold alerts
-        level = None
-        if deviation > self.threshold_red:
-            level = "RED"
+        if result["level"] == "RED":
             self.alert_label.place(relx=0.5, rely=0.5, anchor="center")
             self.anomaly_var.set(f"{deviation:.2f} !!!")
-        elif deviation > self.threshold_orange:
-            level = "ORANGE"
-            self.alert_label.place_forget()
-        elif deviation > self.threshold_yellow:
-            level = "YELLOW"
-            self.alert_label.place_forget()
         else:
             self.alert_label.place_forget()
-        
-        if level:
-            self.add_alert(deviation, level)
-            self.log_message(f"{level} ALERT! Score: {deviation:.2f}", "alert")
-            self.log_anomaly_csv(deviation, vector)
-            threading.Thread(target=self.play_alert_sound, args=(level,), daemon=True).start()
 
 if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+    # Needed for the worker process in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="Quantum Anomaly Detector")
+    parser.add_argument("--backend", default="system", help='sensor backend: "system", "fake" or "replay:FILE"')
+    parser.add_argument("--rate", type=float, default=10.0, help="sample rate in Hz (up to 1000)")
+    parser.add_argument("--process", action="store_true", help="sample and score in a separate worker process")
+    parser.add_argument("--core", type=int, help="with --process, pin the worker to this CPU core")
+    parser.add_argument("--metrics-port", type=int, help="serve metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--profile-startup", action="store_true", help="report the time spent in each startup phase")
+    args = parser.parse_args()
+    profile = StartupProfile(STARTUP_T0) if args.profile_startup else None
+    if profile is not None:
+        profile.mark("imports")
     root = tk.Tk()
-    app = QuantumDetectorApp(root)
+    if profile is not None:
+        profile.mark("tk root")
+    app = QuantumDetectorApp(root, backend=args.backend, sample_rate=args.rate,
+                             worker_process=args.process, pin_core=args.core, metrics_port=args.metrics_port,
+                             profile=profile)
     root.mainloop()
+    # The window was closed normally: nothing to recover on the next launch
+    app.checkpointer.stop(discard=True)
@@ -0,0 +1,222 @@
+import numpy as np
+
+
+def decimate_minmax(values, columns):
+    # Reduce a series to per-pixel-column (min, max) pairs, interleaved in time order
+    # so a polyline through them keeps every spike visible. Returns (x_index, values).
+    n = len(values)
+    columns = int(columns)
+    if columns < 1 or n <= 2 * columns:
+        return np.arange(n, dtype=np.float64), np.asarray(values, dtype=np.float64)
+
+    starts = (np.arange(columns) * n) // columns
+    lo = np.minimum.reduceat(values, starts)
+    hi = np.maximum.reduceat(values, starts)
+    x = np.repeat(starts + (n / columns) / 2, 2)
+    y = np.empty(2 * columns)
+    y[0::2] = lo
+    y[1::2] = hi
+    return x, y
+
+
+class ColumnMinMax:
+    # decimate_minmax kept across frames. Columns cover fixed runs of `step` samples
+    # (a power of two, so it only changes a few times while the history fills)
+    # counted from the start of the history's epoch, which lets a frame fold in just
+    # the samples added since the last one and re-reduce the oldest, partly
+    # scrolled-out column. A frame costs O(columns + step + new samples), where
+    # step is about history length / columns.
+    def __init__(self):
+        self.key = None
+        self.total = 0
+        self.last_id = None
+
+    def update(self, history, position, columns):
+        epoch, total = position
+        n = len(history)
+        columns = int(columns)
+        if columns < 1 or n <= 2 * columns:
+            return decimate_minmax(history, columns)
+        step = 1 << max(int(np.ceil(np.log2(n / columns))), 0)
+        key = (epoch, step, columns)
+        first = total - n
+        if key != self.key or total < self.total or total - self.total > n:
+            self.key = key
+            self.size = columns + 2
+            self.lo = np.empty(self.size)
+            self.hi = np.empty(self.size)
+            self.last_id = None
+            self._fold(history, first)
+        elif total > self.total:
+            self._fold(history[n - (total - self.total):], self.total)
+        self.total = total
+
+        # The oldest column may have lost samples to the left edge: reduce what is left
+        first_id = first // step
+        head = min((first_id + 1) * step - first, n)
+        slot = first_id % self.size
+        self.lo[slot] = history[:head].min()
+        self.hi[slot] = history[:head].max()
+
+        ids = np.arange(first_id, self.last_id + 1)
+        slots = ids % self.size
+        starts = np.maximum(ids * step, first) - first
+        ends = np.minimum((ids + 1) * step, total) - first
+        x = np.repeat((starts + ends) / 2, 2)
+        y = np.empty(2 * len(ids))
+        y[0::2] = self.lo[slots]
+        y[1::2] = self.hi[slots]
+        return x, y
+
+    def _fold(self, values, start):
+        # Adds `values`, the samples numbered from `start` on, to their columns
+        step = self.key[1]
+        index = start + np.arange(len(values))
+        starts = np.concatenate(([0], np.flatnonzero(index[1:] % step == 0) + 1))
+        lo = np.minimum.reduceat(values, starts)
+        hi = np.maximum.reduceat(values, starts)
+        ids = index[starts] // step
+        slots = ids % self.size
+        if ids[0] == self.last_id:
+            lo[0] = min(lo[0], self.lo[slots[0]])
+            hi[0] = max(hi[0], self.hi[slots[0]])
+        self.lo[slots] = lo
+        self.hi[slots] = hi
+        self.last_id = int(ids[-1])
+
+
+class WaveformRenderer:
+    # Retained-mode waveform: items are created once and moved with coords/itemconfig.
+    # The series is decimated to per-column min/max first, so the cost depends on the
+    # canvas width rather than the selected timescale. Given the history's position
+    # and band statistics (DetectorEngine.waveform) the decimation is incremental
+    # and the band costs nothing, so a frame no longer scans the whole history.
+    def __init__(self, canvas, max_val=20.0):
+        self.canvas = canvas
+        self.max_val = max_val
+        self.columns = ColumnMinMax()
+        self.band = canvas.create_rectangle(0, 0, 0, 0, fill="#004400", outline="", state="hidden")
+        self.grid = canvas.create_line(0, 0, 0, 0, fill="#333", dash=(2, 4))
+        self.line = canvas.create_line(0, 0, 0, 0, fill="#00FF00", width=2, state="hidden")
+        self.color = "#00FF00"
+        self.states = {self.band: False, self.line: False}
+
+    def clear(self):
+        self.show(self.band, False)
+        self.show(self.line, False)
+
+    def show(self, item, visible):
+        if self.states[item] != visible:
+            self.states[item] = visible
+            self.canvas.itemconfig(item, state="normal" if visible else "hidden")
+
+    def to_y(self, values, h):
+        return h - (np.minimum(values, self.max_val) / self.max_val) * h
+
+    def draw(self, history, yellow, orange, red, position=None, mean=None, std=None):
+        canvas = self.canvas
+        w = canvas.winfo_width()
+        h = canvas.winfo_height()
+        canvas.coords(self.grid, 0, h / 2, w, h / 2)
+
+        n = len(history)
+        if n < 2:
+            self.clear()
+            return
+
+        # Expected range shading
+        if n > 20:
+            if mean is None:
+                mean = np.mean(history)
+                std = np.std(history)
+            y_upper, y_lower = self.to_y(np.array([mean + 2 * std, mean - 2 * std]), h)
+            canvas.coords(self.band, 0, y_upper, w, y_lower)
+            self.show(self.band, True)
+        else:
+            self.show(self.band, False)
+
+        # Waveform
+        if position is None:
+            x, values = decimate_minmax(history, w)
+        else:
+            x, values = self.columns.update(history, position, w)
+        points = np.empty(2 * len(values))
+        points[0::2] = x * (w / n)
+        points[1::2] = self.to_y(values, h)
+        canvas.coords(self.line, points.tolist())
+
+        color = "#00FF00"
+        if history[-1] > red:
+            color = "#FF0000"
+        elif history[-1] > orange:
+            color = "#FF8800"
+        elif history[-1] > yellow:
+            color = "#FFFF00"
+        if color != self.color:
+            self.color = color
+            canvas.itemconfig(self.line, fill=color)
+        self.show(self.line, True)
+
+
+class SpectrumRenderer:
+    # Retained-mode bar chart; one rectangle per displayed bin, created when the bin
+    # count changes and otherwise only moved and recoloured.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.bars = []
+        self.colors = []
+        self.visible = False
+        self.label = canvas.create_text(0, 5, text="", anchor="ne", fill="#888", font=("Consolas", 8))
+
+    def clear(self):
+        self.set_visible(False)
+
+    def set_visible(self, visible):
+        if visible == self.visible:
+            return
+        self.visible = visible
+        state = "normal" if visible else "hidden"
+        for bar in self.bars:
+            self.canvas.itemconfig(bar, state=state)
+        self.canvas.itemconfig(self.label, state=state)
+
+    def _ensure_bars(self, count):
+        if len(self.bars) == count:
+            return
+        for bar in self.bars:
+            self.canvas.delete(bar)
+        state = "normal" if self.visible else "hidden"
+        self.bars = [self.canvas.create_rectangle(0, 0, 0, 0, fill="#00FF00", outline="", state=state) for _ in range(count)]
+        self.colors = ["#00FF00"] * count
+
+    def draw(self, freqs, magnitude):
+        canvas = self.canvas
+        w = canvas.winfo_width()
+        h = canvas.winfo_height()
+
+        # Skip the DC bin, and merge bins (keeping the peak) if there are more than pixels
+        magnitude = np.asarray(magnitude)[1:]
+        columns = max(int(w) // 2, 1)
+        if len(magnitude) > columns:
+            starts = (np.arange(columns) * len(magnitude)) // columns
+            magnitude = np.maximum.reduceat(magnitude, starts)
+
+        n_bins = len(magnitude) + 1
+        self._ensure_bars(len(magnitude))
+        bar_width = w / n_bins
+        max_magnitude = np.max(magnitude) if len(magnitude) else 1
+        if max_magnitude == 0:
+            max_magnitude = 1
+
+        heights = (magnitude / max_magnitude) * h * 0.9
+        for i, bar in enumerate(self.bars):
+            x = (i + 1) * bar_width
+            canvas.coords(bar, x, h - heights[i], x + bar_width - 1, h)
+            color = "#00FF00" if magnitude[i] < max_magnitude * 0.7 else "#FFFF00"
+            if color != self.colors[i]:
+                self.colors[i] = color
+                canvas.itemconfig(bar, fill=color)
+
+        canvas.coords(self.label, w - 5, 5)
+        canvas.itemconfig(self.label, text=f"0 - {freqs[-1]:.1f} Hz")
+        self.set_visible(True)
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed-capacity, contiguous float64 ring with one row per sample (and one column
+    # per vector component when `width` is set). Every row is written twice, at i and
+    # i + capacity, so the most recent n rows are always a single slice and can be
+    # handed out as zero-copy views.
+    def __init__(self, capacity, width=None):
+        self.capacity = max(int(capacity), 1)
+        self.width = width
+        self.data = np.zeros(self._shape(self.capacity))
+        self.head = 0
+        self.count = 0
+
+    def _shape(self, capacity):
+        return (2 * capacity,) if self.width is None else (2 * capacity, self.width)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def maxlen(self):
+        return self.capacity
+
+    def full(self):
+        return self.count == self.capacity
+
+    def append(self, row):
+        self.data[self.head] = row
+        self.data[self.head + self.capacity] = row
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=np.float64)
+        if len(rows) == 0:
+            return
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        first = min(n, self.capacity - self.head)
+        for start, chunk in ((self.head, rows[:first]), (0, rows[first:])):
+            if len(chunk):
+                self.data[start:start + len(chunk)] = chunk
+                self.data[start + self.capacity:start + self.capacity + len(chunk)] = chunk
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def oldest(self):
+        # Row that the next append will overwrite once the ring is full
+        return self.data[self.head] if self.full() else self.data[self.head - self.count]
+
+    def last(self):
+        return self.data[self.head + self.capacity - 1]
+
+    def latest(self, n=None):
+        n = self.count if n is None else min(int(n), self.count)
+        end = self.head + self.capacity
+        view = self.data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def resize(self, capacity):
+        capacity = max(int(capacity), 1)
+        if capacity == self.capacity:
+            return
+        recent = self.latest(capacity)
+        n = len(recent)
+        data = np.zeros(self._shape(capacity))
+        data[:n] = recent
+        data[capacity:capacity + n] = recent
+        self.data = data
+        self.capacity = capacity
+        self.head = n % capacity
+        self.count = n
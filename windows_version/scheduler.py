@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+
+MIN_RATE = 0.1
+MAX_RATE = 1000.0
+# Default share of a period the busy-wait may take, so fast rates leave time for
+# other threads; a scheduler alone in its process can pass spin_fraction=1
+SPIN_FRACTION = 0.25
+# Longest sleep between checks for a rate change made by another thread
+RATE_CHECK = 0.1
+
+
+class DeadlineScheduler:
+    # Ticks at a fixed rate against absolute deadlines (start + k * period), so the
+    # time spent sampling and scoring does not stretch the period and errors do not
+    # accumulate. A tick that wakes more than a full period late counts as an overrun;
+    # the deadlines it missed are skipped rather than replayed in a burst.
+    def __init__(self, rate=10.0, spin=0.002, rate_window=256, spin_fraction=SPIN_FRACTION):
+        self.set_rate(rate)
+        self._apply_rate()
+        # Sleep to within `spin` seconds (at most `spin_fraction` of a period) of the
+        # deadline, then busy-wait the rest; OS sleeps alone are too coarse above
+        # ~100 Hz on Windows
+        self.spin = spin
+        self.spin_fraction = spin_fraction
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+        self.tick_times = deque(maxlen=rate_window)
+        self.deadline = None
+        # Offset from the monotonic clock to epoch seconds, fixed at construction so
+        # per-sample timestamps are as regular as the ticks themselves
+        self.epoch_offset = time.time() - time.perf_counter()
+
+    def set_rate(self, rate):
+        # May be called from any thread: the new rate is only recorded here and
+        # takes over at the start of the next wait(), on the sampling thread
+        rate = float(rate)
+        if not MIN_RATE <= rate <= MAX_RATE:
+            raise ValueError(f"Sample rate must be between {MIN_RATE:g} and {MAX_RATE:g} Hz")
+        self.rate = rate
+        self.pending_rate = rate
+
+    def _apply_rate(self):
+        rate, self.pending_rate = self.pending_rate, None
+        if rate is not None:
+            self.period = 1.0 / rate
+            self.deadline = None
+
+    def reset(self):
+        # Restart the deadline sequence, e.g. after a pause
+        self.deadline = None
+        self.tick_times.clear()
+
+    def wait(self, stop_event=None):
+        # Blocks until the next deadline; returns its epoch timestamp, or None if
+        # `stop_event` was set while waiting
+        stop_event = stop_event or threading.Event()
+        while True:
+            self._apply_rate()
+            period = self.period
+            now = time.perf_counter()
+            deadline = now if self.deadline is None else self.deadline
+            remaining = deadline - now
+            spin = min(self.spin, period * self.spin_fraction)
+            if remaining <= spin:
+                break
+            # Sleeps in slices so a rate change does not wait out a long period
+            if stop_event.wait(min(remaining - spin, RATE_CHECK)):
+                return None
+            if self.pending_rate is None and time.perf_counter() >= deadline - spin:
+                break
+        while time.perf_counter() < deadline:
+            # Yields the GIL so the spin does not starve the GUI thread
+            time.sleep(0)
+
+        now = time.perf_counter()
+        late = now - deadline
+        self.lateness = late
+        self.max_lateness = max(self.max_lateness, late)
+        tick = deadline
+        if late >= period:
+            missed = int(late // period)
+            self.overruns += 1
+            self.skipped += missed
+            tick += missed * period
+        self.deadline = tick + period
+        self.ticks += 1
+        self.tick_times.append(now)
+        return self.epoch_offset + now
+
+    def measured_rate(self):
+        if len(self.tick_times) < 2:
+            return self.rate
+        span = self.tick_times[-1] - self.tick_times[0]
+        return (len(self.tick_times) - 1) / span if span > 0 else self.rate
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "measured_rate": self.measured_rate(),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "lateness": self.lateness,
+            "max_lateness": self.max_lateness,
+        }
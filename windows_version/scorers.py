@@ -0,0 +1,507 @@
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+from ringbuffer import RingBuffer
+
+
+class RollingStats:
+    # Sliding-window mean/variance using Welford add/replace updates, O(1) per sample.
+    # Floating-point drift is bounded by recomputing exactly every few windows.
+    def __init__(self, window, resync_every=8):
+        self.window = int(window)
+        self.resync_every = resync_every
+        self.resync_interval = self.window * resync_every
+        self.values = RingBuffer(self.window)
+        self.clear()
+
+    def resize(self, window):
+        # Keeps the most recent values that still fit
+        self.window = int(window)
+        self.resync_interval = self.window * self.resync_every
+        self.values.resize(self.window)
+        self.resync()
+
+    def clear(self):
+        self.values.clear()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.pushes = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, x):
+        x = float(x)
+        n = len(self.values)
+        if n == self.window:
+            y = float(self.values.oldest())
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - y) / n
+            self.m2 += (x - y) * (x - self.mean + y - old_mean)
+        else:
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / (n + 1)
+            self.m2 += delta * (x - self.mean)
+
+        self.pushes += 1
+        if self.pushes >= self.resync_interval:
+            self.resync()
+
+    def resync(self):
+        self.pushes = 0
+        if not self.values:
+            self.mean = self.m2 = 0.0
+            return
+        values = self.values.latest()
+        self.mean = float(np.mean(values))
+        self.m2 = float(np.sum((values - self.mean) ** 2))
+
+    @property
+    def variance(self):
+        n = len(self.values)
+        if n == 0:
+            return 0.0
+        return max(self.m2, 0.0) / n
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class AttractorScorer:
+    # Distance from the centroid of the last `window` vectors (current one included),
+    # kept as a running sum so each sample costs O(d) regardless of window length.
+    def __init__(self, window=50, resync_every=8):
+        self.window = int(window)
+        self.resync_interval = self.window * resync_every
+        self.vectors = None
+        self.clear()
+
+    def clear(self):
+        if self.vectors is not None:
+            self.vectors.clear()
+        self.total = None
+        self.pushes = 0
+
+    def update(self, vector, magnitude=None):
+        v = np.asarray(vector, dtype=np.float64)
+        if self.total is None or self.total.shape != v.shape:
+            self.vectors = RingBuffer(self.window, len(v))
+            self.total = np.zeros_like(v)
+        if self.vectors.full():
+            self.total -= self.vectors.oldest()
+        self.vectors.append(v)
+        self.total += v
+
+        self.pushes += 1
+        if self.pushes >= self.resync_interval:
+            self.pushes = 0
+            self.total = self.vectors.latest().sum(axis=0)
+
+        n = len(self.vectors)
+        if n < 2:
+            return 0
+        centroid = self.total / n
+        return float(np.linalg.norm(v - centroid))
+
+
+class ZScoreScorer:
+    # Scores the vector magnitude against the mean/std of the preceding `window` magnitudes
+    def __init__(self, window=30, min_samples=10):
+        self.stats = RollingStats(window)
+        self.min_samples = min_samples
+
+    def clear(self):
+        self.stats.clear()
+
+    def update(self, vector, magnitude):
+        score = 0
+        if len(self.stats) >= self.min_samples:
+            std = self.stats.std
+            if std != 0:
+                score = abs((magnitude - self.stats.mean) / std)
+        self.stats.push(magnitude)
+        return score
+
+
+class SortedWindow:
+    # Sliding window kept in sorted order for order statistics. Values live in
+    # sorted buckets of roughly `load` items with a Fenwick tree over bucket sizes,
+    # so insert, evict and k-th smallest are O(log n) (amortised over bucket splits).
+    def __init__(self, window, load=64):
+        self.window = int(window)
+        self.load = load
+        self.order = deque()
+        self.clear()
+
+    def clear(self):
+        self.order.clear()
+        self.buckets = []
+        self.maxes = []
+        self.tree = [0]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, x):
+        x = float(x)
+        if self.size >= self.window:
+            self._remove(self.order.popleft())
+        self.order.append(x)
+        self._insert(x)
+
+    def _rebuild_tree(self):
+        tree = [0] + [len(b) for b in self.buckets]
+        n = len(tree)
+        for i in range(1, n):
+            j = i + (i & -i)
+            if j < n:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, b, delta):
+        tree = self.tree
+        i = b + 1
+        n = len(tree)
+        while i < n:
+            tree[i] += delta
+            i += i & -i
+
+    def _insert(self, x):
+        buckets, maxes = self.buckets, self.maxes
+        self.size += 1
+        if not buckets:
+            buckets.append([x])
+            maxes.append(x)
+            self._rebuild_tree()
+            return
+
+        b = bisect_left(maxes, x)
+        if b == len(buckets):
+            b -= 1
+            buckets[b].append(x)
+            maxes[b] = x
+        else:
+            insort(buckets[b], x)
+
+        bucket = buckets[b]
+        if len(bucket) > 2 * self.load:
+            buckets[b:b + 1] = [bucket[:self.load], bucket[self.load:]]
+            maxes[b:b + 1] = [bucket[self.load - 1], bucket[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(b, 1)
+
+    def _remove(self, x):
+        buckets, maxes = self.buckets, self.maxes
+        b = bisect_left(maxes, x)
+        bucket = buckets[b]
+        del bucket[bisect_left(bucket, x)]
+        self.size -= 1
+
+        if len(bucket) < self.load // 2 and len(buckets) > 1:
+            # Merge undersized buckets into a neighbour to keep the bucket count near n/load
+            n = b - 1 if b == len(buckets) - 1 else b
+            merged = buckets[n] + buckets[n + 1]
+            if len(merged) > 2 * self.load:
+                half = len(merged) // 2
+                buckets[n:n + 2] = [merged[:half], merged[half:]]
+                maxes[n:n + 2] = [merged[half - 1], merged[-1]]
+            else:
+                buckets[n:n + 2] = [merged]
+                maxes[n:n + 2] = [merged[-1]]
+            self._rebuild_tree()
+        elif not bucket:
+            del buckets[b]
+            del maxes[b]
+            self._rebuild_tree()
+        else:
+            maxes[b] = bucket[-1]
+            self._tree_add(b, -1)
+
+    def __getitem__(self, k):
+        # k-th smallest value (0-based)
+        if k < 0:
+            k += self.size
+        if not 0 <= k < self.size:
+            raise IndexError("SortedWindow index out of range")
+        tree = self.tree
+        n = len(tree) - 1
+        pos = 0
+        step = 1 << (n.bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return self.buckets[pos][k]
+
+    def rank(self, x):
+        # Number of values strictly less than x
+        b = bisect_left(self.maxes, x)
+        if b == len(self.buckets):
+            return self.size
+        count = bisect_left(self.buckets[b], x)
+        i = b
+        tree = self.tree
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+    def sorted(self):
+        return [x for bucket in self.buckets for x in bucket]
+
+    def median(self):
+        n = self.size
+        if n % 2:
+            return self[n // 2]
+        return (self[n // 2 - 1] + self[n // 2]) / 2
+
+    def quantile(self, q):
+        # Same interpolation as np.percentile(..., method="linear")
+        n = self.size
+        virtual = (n - 1) * q
+        lo = min(max(int(math.floor(virtual)), 0), n - 1)
+        hi = min(lo + 1, n - 1)
+        gamma = virtual - math.floor(virtual)
+        return _lerp(self[lo], self[hi], gamma)
+
+    def mad(self, center=None):
+        # Median absolute deviation from `center` (the window median by default).
+        # Deviations below and above the centre form two sorted runs, so the k-th
+        # smallest deviation is a binary search over the split: O(log^2 n).
+        n = self.size
+        if n == 0:
+            return 0.0
+        m = self.median() if center is None else center
+        p = self.rank(m)
+        if n % 2:
+            return self._kth_deviation(n // 2, m, p)
+        return (self._kth_deviation(n // 2 - 1, m, p) + self._kth_deviation(n // 2, m, p)) / 2
+
+    def _kth_deviation(self, k, m, p):
+        below = p
+        above = self.size - p
+
+        def lower(j):
+            return m - self[p - 1 - j]
+
+        def upper(j):
+            return self[p + j] - m
+
+        lo, hi = max(0, k + 1 - above), min(k + 1, below)
+        while lo < hi:
+            i = (lo + hi) // 2
+            j = k + 1 - i
+            if j > 0 and lower(i) < upper(j - 1):
+                lo = i + 1
+            else:
+                hi = i
+        i, j = lo, k + 1 - lo
+        candidates = []
+        if i > 0:
+            candidates.append(lower(i - 1))
+        if j > 0:
+            candidates.append(upper(j - 1))
+        return max(candidates)
+
+
+def _lerp(a, b, t):
+    if a == b:
+        return a
+    diff = b - a
+    if t >= 0.5:
+        return b - diff * (1 - t)
+    return a + diff * t
+
+
+def row_median(sorted_rows, counts):
+    # Median of the first counts[i] entries of each sorted row, averaging the two
+    # middle values for even counts (as SortedWindow.median does)
+    rows = np.arange(len(sorted_rows))
+    lo = sorted_rows[rows, np.maximum(counts - 1, 0) // 2]
+    hi = sorted_rows[rows, counts // 2]
+    return (lo + hi) / 2
+
+
+def row_quantile(sorted_rows, counts, q):
+    # numpy's "linear" quantile of the first counts[i] entries of each sorted row,
+    # with the same interpolation as SortedWindow.quantile
+    rows = np.arange(len(sorted_rows))
+    virtual = (counts - 1) * q
+    lo = np.clip(np.floor(virtual).astype(np.int64), 0, np.maximum(counts - 1, 0))
+    hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+    t = virtual - np.floor(virtual)
+    a = sorted_rows[rows, lo]
+    b = sorted_rows[rows, hi]
+    diff = b - a
+    value = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+    return np.where(a == b, a, value)
+
+
+def zscore_row_scores(magnitudes, data, counts, valid, ready):
+    # ZScoreScorer for many windows at once (rows as in robust_row_scores). A window
+    # of identical values has std exactly 0, as the running Welford sums give it,
+    # rather than whatever rounding leaves of the two-pass sum.
+    n = np.maximum(counts, 1)
+    mean = np.where(valid, data, 0).sum(axis=1) / n
+    std = np.sqrt(np.where(valid, (data - mean[:, None]) ** 2, 0).sum(axis=1) / n)
+    constant = np.where(valid, data, np.inf).min(axis=1) == np.where(valid, data, -np.inf).max(axis=1)
+    ok = ready & (std != 0) & ~constant
+    return np.where(ok, np.abs(magnitudes - mean) / np.where(ok, std, 1), 0.0)
+
+
+def robust_row_scores(magnitudes, data, counts, valid, ready):
+    # IQR and MAD scores for many windows at once: row i of `data` is the window for
+    # magnitudes[i], valid[i] marks its counts[i] real entries (anywhere in the row)
+    # and rows not `ready` score 0. Same semantics as IQRScorer and MADScorer.
+    with np.errstate(invalid="ignore"):
+        # Rows with no samples yet compute inf - inf; they are masked out below
+        ordered = np.sort(np.where(valid, data, np.inf), axis=1)
+        q1 = row_quantile(ordered, counts, 0.25)
+        q3 = row_quantile(ordered, counts, 0.75)
+        median = row_median(ordered, counts)
+        iqr = q3 - q1
+        outside = (magnitudes < q1 - 1.5 * iqr) | (magnitudes > q3 + 1.5 * iqr)
+        iqr_scores = np.where(ready & outside, np.abs(magnitudes - median), 0.0)
+
+        deviations = np.sort(np.where(valid, np.abs(data - median[:, None]), np.inf), axis=1)
+        mad = row_median(deviations, counts)
+        ok = ready & (mad != 0)
+        mad_scores = np.where(ok, np.abs(magnitudes - median) / (1.4826 * np.where(ok, mad, 1)), 0.0)
+    return iqr_scores, mad_scores
+
+
+class IQRScorer:
+    # Tukey fences over a sliding window of magnitudes; scores distance from the median
+    def __init__(self, window=50, min_samples=10):
+        self.values = SortedWindow(window)
+        self.min_samples = min_samples
+
+    def clear(self):
+        self.values.clear()
+
+    def update(self, vector, magnitude):
+        score = 0
+        values = self.values
+        if len(values) >= self.min_samples:
+            q1 = values.quantile(0.25)
+            q3 = values.quantile(0.75)
+            iqr = q3 - q1
+            if magnitude < q1 - 1.5 * iqr or magnitude > q3 + 1.5 * iqr:
+                score = abs(magnitude - values.median())
+        values.push(magnitude)
+        return score
+
+
+class MADScorer:
+    # Robust z-score of the magnitude using the window median and scaled MAD
+    def __init__(self, window=50, min_samples=10):
+        self.values = SortedWindow(window)
+        self.min_samples = min_samples
+
+    def clear(self):
+        self.values.clear()
+
+    def update(self, vector, magnitude):
+        score = 0
+        values = self.values
+        if len(values) >= self.min_samples:
+            median = values.median()
+            mad = values.mad(median)
+            if mad != 0:
+                score = abs((magnitude - median) / (1.4826 * mad))
+        values.push(magnitude)
+        return score
+
+
+def chi_square_z(d2, k):
+    # Wilson-Hilferty: maps a chi-square(k) value (here a squared Mahalanobis
+    # distance) to an approximately standard normal z; works on arrays as well
+    c = 2.0 / (9.0 * k)
+    return (np.cbrt(d2 / k) - (1.0 - c)) / math.sqrt(c)
+
+
+class MahalanobisScorer:
+    # Mahalanobis distance of the vector from an exponentially weighted mean and
+    # covariance of the preceding vectors, so every channel is measured in its own
+    # units and correlated channels are not counted twice. The weight of a new
+    # sample is max(1/n, 1/window): the exact mean and covariance until n reaches
+    # `window`, an exponential average after. The inverse covariance is kept current
+    # by a Sherman-Morrison rank-1 update (O(d^2) per sample) and recomputed from the
+    # covariance every `reinvert_every` windows, with a small ridge so channels that
+    # sit still cannot make it singular. Scores are the distance mapped to a z-score
+    # (see chi_square_z), so the thresholds mean the same as for Z-Score.
+    def __init__(self, window=100, min_samples=20, reinvert_every=1, ridge=1e-3):
+        self.window = int(window)
+        self.min_samples = min_samples
+        self.reinvert_interval = max(int(self.window * reinvert_every), 1)
+        self.ridge = ridge
+        self.mean = None
+        self.clear()
+
+    def clear(self):
+        if self.mean is not None:
+            self.mean[:] = 0
+            self.cov[:] = 0
+        self.precision = None
+        self.count = 0
+        self.since_inversion = 0
+
+    def _reset(self, width):
+        self.mean = np.zeros(width)
+        self.cov = np.zeros((width, width))
+        self.scratch = np.zeros((width, width))
+        self.clear()
+
+    def invert(self):
+        d = len(self.mean)
+        ridge = self.ridge * max(np.trace(self.cov) / d, 1e-12)
+        regularised = self.cov + ridge * np.eye(d)
+        try:
+            self.precision = np.linalg.inv(regularised)
+        except np.linalg.LinAlgError:
+            self.precision = np.linalg.pinv(regularised)
+        self.since_inversion = 0
+
+    def update(self, vector, magnitude=None):
+        v = np.asarray(vector, dtype=np.float64)
+        if self.mean is None or self.mean.shape != v.shape:
+            self._reset(len(v))
+
+        score = 0
+        delta = v - self.mean
+        if self.precision is not None:
+            u = self.precision @ delta
+            d2 = max(float(delta @ u), 0.0)
+            score = max(float(chi_square_z(d2, len(v))), 0.0)
+
+        self.count += 1
+        alpha = max(1.0 / self.count, 1.0 / self.window)
+        self.mean += alpha * delta
+        # cov <- (1 - alpha) * (cov + alpha * delta delta^T)
+        np.outer(delta, delta, out=self.scratch)
+        self.scratch *= alpha
+        self.cov += self.scratch
+        self.cov *= 1.0 - alpha
+
+        if self.precision is not None:
+            # The same update applied to the inverse, by Sherman-Morrison
+            np.outer(u, u, out=self.scratch)
+            self.scratch *= alpha / (1.0 + alpha * d2)
+            self.precision -= self.scratch
+            self.precision /= 1.0 - alpha
+            self.since_inversion += 1
+            if self.since_inversion >= self.reinvert_interval:
+                self.invert()
+        elif self.count >= self.min_samples:
+            self.invert()
+        return score
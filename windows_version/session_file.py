@@ -0,0 +1,233 @@
+import datetime
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+from datalog import SCALAR_FIELDS
+
+SESSION_MAGIC = b"QDSESS1\n"
+RECORD_MAGIC = b"QREC"
+ALIGN = 64
+LOG_FIELDS = ["time", "entropy", "deviation", "zscore", "vector"]
+# Rows copied at a time when streaming a column into a record
+WRITE_ROWS = 65536
+
+
+class SessionWriter:
+    # Session files are a magic string followed by self-describing records: a small
+    # JSON header (array name, dtype, shape, append/replace) padded to 64 bytes, then
+    # the raw array bytes. Appending records is how checkpoints stay incremental. A
+    # "meta" record commits the arrays written before it: the last one wins, and
+    # arrays after it (a checkpoint cut short by a crash) are ignored on load.
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, "wb")
+        self.f.write(SESSION_MAGIC)
+
+    def _record(self, header, payload=b""):
+        header = json.dumps(header).encode("utf-8")
+        size = len(RECORD_MAGIC) + 4 + len(header)
+        header += b" " * (-(self.f.tell() + size) % ALIGN)
+        self.f.write(RECORD_MAGIC)
+        self.f.write(len(header).to_bytes(4, "little"))
+        self.f.write(header)
+        if payload:
+            self.f.write(payload)
+
+    def write_array(self, name, array, mode="append"):
+        array = np.ascontiguousarray(array)
+        self._record({"kind": "array", "name": name, "mode": mode, "dtype": array.dtype.str,
+                      "shape": list(array.shape), "nbytes": array.nbytes},
+                     memoryview(array).cast("B") if array.nbytes else b"")
+
+    def write_parts(self, name, parts, mode="append"):
+        # One record holding `parts` (arrays of one dtype) joined along the first
+        # axis, streamed a block at a time so the whole array is never in memory
+        dtype, tail = parts[0].dtype, parts[0].shape[1:]
+        rows = sum(len(part) for part in parts)
+        self._record({"kind": "array", "name": name, "mode": mode, "dtype": dtype.str,
+                      "shape": [rows, *tail], "nbytes": rows * int(np.prod(tail, dtype=np.int64)) * dtype.itemsize})
+        for part in parts:
+            for start in range(0, len(part), WRITE_ROWS):
+                block = np.ascontiguousarray(part[start:start + WRITE_ROWS], dtype=dtype)
+                self.f.write(memoryview(block).cast("B"))
+
+    def write_meta(self, meta):
+        self._record({"kind": "meta", "meta": meta})
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+
+def load_session_file(path):
+    # Returns (meta, arrays). Arrays stored as a single record are memory-mapped in
+    # place; arrays built from several checkpoint segments are concatenated.
+    size = os.path.getsize(path)
+    segments = {}
+    pending = []
+    meta = {}
+    with open(path, "rb") as f:
+        if f.read(len(SESSION_MAGIC)) != SESSION_MAGIC:
+            raise ValueError(f"{os.path.basename(path)} is not a session file")
+        while True:
+            if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+                break
+            length_bytes = f.read(4)
+            if len(length_bytes) < 4:
+                break
+            try:
+                header = json.loads(f.read(int.from_bytes(length_bytes, "little")))
+            except ValueError:
+                break
+            offset = f.tell()
+            if header["kind"] == "meta":
+                meta = header["meta"]
+                for name, mode, entry in pending:
+                    if mode == "replace":
+                        segments[name] = [entry]
+                    else:
+                        segments.setdefault(name, []).append(entry)
+                pending.clear()
+                continue
+            nbytes = header["nbytes"]
+            if offset + nbytes > size:
+                break  # torn write from an interrupted checkpoint
+            f.seek(offset + nbytes)
+            entry = (offset, np.dtype(header["dtype"]), tuple(header["shape"]))
+            pending.append((header["name"], header.get("mode"), entry))
+
+    arrays = {}
+    for name, parts in segments.items():
+        views = [np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+                 if np.prod(shape) else np.zeros(shape, dtype=dtype)
+                 for offset, dtype, shape in parts]
+        arrays[name] = views[0] if len(views) == 1 else np.concatenate(views)
+    return meta, arrays
+
+
+def write_session(path, meta, history, data_log):
+    # Full snapshot: one record per array so every column loads as a single memmap.
+    # Log columns are streamed from the log's chunks rather than joined in memory.
+    tmp = path + ".tmp"
+    writer = SessionWriter(tmp)
+    writer.write_array("history", np.asarray(history, dtype=np.float64), mode="replace")
+    for name in LOG_FIELDS:
+        parts = list(data_log.iter_chunks(name))
+        if not parts:
+            writer.write_array(f"log.{name}", data_log.column(name))
+            continue
+        if name in SCALAR_FIELDS:
+            parts = [part[:, 0] for part in parts]
+        writer.write_parts(f"log.{name}", parts)
+    writer.write_meta(meta)
+    writer.close()
+    os.replace(tmp, path)
+
+
+def recover_checkpoint(path, keep=5):
+    # Moves a checkpoint left by a run that did not shut down cleanly out of the way
+    # before a new checkpointer truncates it, keeping the newest `keep` such copies.
+    # Returns its new name (stamped with its last write time), or None if there was
+    # nothing worth keeping.
+    try:
+        if os.path.getsize(path) <= len(SESSION_MAGIC):
+            return None
+        stamp = datetime.datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d-%H%M%S")
+        root, ext = os.path.splitext(path)
+        recovered = f"{root}-{stamp}{ext}"
+        os.replace(path, recovered)
+    except OSError:
+        return None
+    for old in sorted(glob.glob(f"{glob.escape(root)}-*{ext}"))[:-keep]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return recovered
+
+
+class SessionCheckpointer:
+    # Appends the rows added to `data_log` since the previous checkpoint, plus the
+    # current metadata, every `interval` seconds on a background thread. The meta
+    # record commits each checkpoint, so a crash mid-write loses only that one.
+    def __init__(self, path, data_log, get_meta, interval=10.0):
+        self.path = path
+        self.data_log = data_log
+        self.get_meta = get_meta
+        self.interval = interval
+        self.written = 0
+        self.writer = None
+        self.stopped = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        rows = len(self.data_log)
+        if rows < self.written:
+            # The log was cleared; start a fresh checkpoint file
+            self.close_writer()
+            self.written = 0
+        if rows == self.written and self.writer is not None:
+            return
+        try:
+            if self.writer is None:
+                self.writer = SessionWriter(self.path)
+            for name in LOG_FIELDS:
+                self.writer.write_array(f"log.{name}", self.data_log.slice(name, self.written, rows))
+            self.writer.write_meta(self.get_meta())
+            self.writer.sync()
+            self.written = rows
+        except OSError:
+            # The next attempt rewrites the file from scratch
+            self.close_writer()
+            self.written = 0
+
+    def close_writer(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except OSError:
+                pass
+            self.writer = None
+
+    def stop(self, discard=False):
+        # Writes a final checkpoint, or on an orderly shutdown (`discard`) deletes the
+        # file so the next run does not mistake it for a crash. Only the first call acts.
+        if self.stopped:
+            return
+        self.stopped = True
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=self.interval + 1)
+        if not discard:
+            self.checkpoint()
+        self.close_writer()
+        if discard:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def session_history(arrays, maxlen=None):
+    # Deviation history of a session; checkpoints rebuild it from the log tail
+    history = arrays.get("history")
+    if history is None:
+        history = arrays.get("log.deviation", np.zeros(0))
+    return history if maxlen is None else history[-int(maxlen):]
+
@@ -0,0 +1,298 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from memprobe import MemoryProbe
+
+VECTOR_FIELDS = ["cpu", "ram", "gpu_temp", "gpu_power", "mem_l1", "mem_l2", "mem_l3_cold", "mem_dram", "time_jitter"]
+
+
+class Source:
+    # One sensor. `fields` names the vector components it fills, `interval` is the
+    # minimum time between polls (0 polls on every sample) and `slow` sources are
+    # polled on the sampler's worker pool instead of on the sampling thread; between
+    # polls the most recent reading is reused.
+    name = "source"
+    fields = []
+    interval = 0.0
+    slow = False
+
+    def open(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def info(self):
+        return None
+
+
+class CpuSource(Source):
+    name = "cpu"
+    fields = ["cpu"]
+
+    def open(self):
+        import psutil
+        self.psutil = psutil
+
+    def read(self):
+        return [self.psutil.cpu_percent(interval=None)]
+
+
+class MemorySource(Source):
+    name = "ram"
+    fields = ["ram"]
+    interval = 1.0
+
+    def open(self):
+        import psutil
+        self.psutil = psutil
+
+    def read(self):
+        return [self.psutil.virtual_memory().percent]
+
+
+class NvmlSource(Source):
+    # NVML calls take milliseconds and temperature moves on a scale of seconds
+    name = "nvml"
+    fields = ["gpu_temp", "gpu_power"]
+    interval = 1.0
+    slow = True
+
+    def __init__(self, index=0):
+        self.index = index
+        self.handle = None
+        self.pynvml = None
+        self.gpu_info = "GPU: Detecting..."
+
+    def open(self):
+        try:
+            import pynvml
+        except ImportError:
+            self.gpu_info = "GPU: NVML not installed"
+            return
+        self.pynvml = pynvml
+        try:
+            pynvml.nvmlInit()
+            self.handle = pynvml.nvmlDeviceGetHandleByIndex(self.index)
+            name = pynvml.nvmlDeviceGetName(self.handle)
+            if isinstance(name, bytes):
+                name = name.decode('utf-8')
+            self.gpu_info = f"GPU: {name}"
+        except Exception:
+            self.gpu_info = "GPU: Error"
+            self.handle = None
+
+    def read(self):
+        if self.handle is None:
+            return [0, 0]
+        pynvml = self.pynvml
+        try:
+            temp = pynvml.nvmlDeviceGetTemperature(self.handle, pynvml.NVML_TEMPERATURE_GPU)
+            power = pynvml.nvmlDeviceGetPowerUsage(self.handle)
+            return [temp, power / 1000.0]
+        except Exception:
+            return [0, 0]
+
+    def info(self):
+        return self.gpu_info
+
+
+class MemoryLatencySource(Source):
+    # Dependent-load latency per cache level and DRAM from the pointer-chasing
+    # probe, in ns per load above the interpreter's own cost
+    name = "mem_latency"
+    fields = ["mem_l1", "mem_l2", "mem_l3_cold", "mem_dram"]
+
+    def __init__(self, **options):
+        self.options = options
+        self.probe = None
+        self.ram_info = "RAM: Detecting..."
+
+    def open(self):
+        try:
+            self.probe = MemoryProbe(**self.options).open()
+            self.ram_info = f"RAM: {self.probe.summary()}"
+        except MemoryError:
+            self.ram_info = "RAM: Probe buffer failed"
+            self.probe = None
+
+    def read(self):
+        if self.probe is None:
+            return [0.0] * len(self.fields)
+        return self.probe.read()
+
+    def close(self):
+        if self.probe is not None:
+            self.probe.close()
+            self.probe = None
+
+    def info(self):
+        return self.ram_info
+
+
+class TimeJitterSource(Source):
+    name = "time_jitter"
+    fields = ["time_jitter"]
+
+    def read(self):
+        return [(time.perf_counter() * 1000000) % 100]
+
+
+class FakeSource(Source):
+    # Gaussian noise around typical readings, with an occasional spike, for machines
+    # without the real sensors
+    name = "fake"
+    fields = list(VECTOR_FIELDS)
+    means = [20.0, 45.0, 50.0, 30.0, 1.0, 4.0, 15.0, 80.0, 50.0]
+    stds = [1.5, 0.2, 0.3, 0.5, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+    def __init__(self, spike_rate=0.002, seed=None):
+        self.spike_rate = spike_rate
+        self.rng = np.random.default_rng(seed)
+
+    def read(self):
+        vector = self.rng.normal(self.means, self.stds)
+        if self.rng.random() < self.spike_rate:
+            vector[self.rng.integers(len(vector))] *= 4
+        return vector.tolist()
+
+    def info(self):
+        return "Fake sensors"
+
+
+class ReplaySource(Source):
+    # Plays back the vectors of a recorded file, looping at the end
+    name = "replay"
+    fields = list(VECTOR_FIELDS)
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.vectors = None
+        self.position = 0
+
+    def open(self):
+        # Imported here because the engine module imports this one
+        from detector_engine import load_vectors
+        self.vectors = [vector for _, vector in load_vectors(self.path)]
+        if not self.vectors:
+            raise ValueError(f"{self.path} has no recorded vectors to replay")
+        self.fields = [f"v{i}" for i in range(len(self.vectors[0]))]
+
+    def read(self):
+        if self.position >= len(self.vectors):
+            if not self.loop:
+                return self.vectors[-1]
+            self.position = 0
+        vector = self.vectors[self.position]
+        self.position += 1
+        return vector
+
+    def info(self):
+        return f"Replay: {len(self.vectors)} samples"
+
+
+SOURCES = {
+    "cpu": CpuSource,
+    "ram": MemorySource,
+    "nvml": NvmlSource,
+    "mem_latency": MemoryLatencySource,
+    "time_jitter": TimeJitterSource,
+    "fake": FakeSource,
+    "replay": ReplaySource,
+}
+
+BACKENDS = {
+    "system": ["cpu", "ram", "nvml", "mem_latency", "time_jitter"],
+    "fake": ["fake"],
+}
+
+
+def register_source(name, cls):
+    SOURCES[name] = cls
+
+
+def build_sources(backend="system"):
+    # "system", "fake", "replay:<file>" or a comma-separated list of source names
+    if backend.startswith("replay:"):
+        return [ReplaySource(backend.split(":", 1)[1])]
+    names = BACKENDS.get(backend, backend.split(","))
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown sensor source: {', '.join(unknown)}")
+    return [SOURCES[name]() for name in names]
+
+
+class SourceSampler:
+    # Builds each vector from a set of sources. Due fast sources are read inline;
+    # due slow sources are submitted to a thread pool and the vector uses their last
+    # completed reading, so a slow sensor never delays a sample.
+    def __init__(self, sources, workers=2, metrics=None):
+        self.sources = list(sources)
+        self.workers = workers
+        self.metrics = metrics
+        self.pool = None
+        self.cache = {}
+        self.due = {}
+        self.pending = {}
+        self.errors = {}
+
+    def start(self):
+        for source in self.sources:
+            source.open()
+            # The first reading is taken synchronously so vectors start complete
+            self.cache[source] = self._read(source)
+            self.due[source] = time.monotonic() + source.interval
+        if any(source.slow for source in self.sources):
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sensor")
+        return self
+
+    def _read(self, source):
+        start = time.perf_counter()
+        try:
+            values = [float(value) for value in source.read()]
+        except Exception:
+            self.errors[source.name] = self.errors.get(source.name, 0) + 1
+            return self.cache.get(source, [0.0] * len(source.fields))
+        if self.metrics is not None:
+            self.metrics.observe(f"source.{source.name}", time.perf_counter() - start)
+        return values
+
+    def _poll_slow(self, source):
+        self.cache[source] = self._read(source)
+
+    def fields(self):
+        return [field for source in self.sources for field in source.fields]
+
+    def info(self):
+        return [text for text in (source.info() for source in self.sources) if text]
+
+    def get_system_vector(self):
+        now = time.monotonic()
+        for source in self.sources:
+            if now < self.due[source]:
+                continue
+            if not source.slow:
+                self.cache[source] = self._read(source)
+                self.due[source] = now + source.interval
+            elif self.pool is not None:
+                future = self.pending.get(source)
+                if future is None or future.done():
+                    self.pending[source] = self.pool.submit(self._poll_slow, source)
+                    self.due[source] = now + source.interval
+        vector = []
+        for source in self.sources:
+            vector.extend(self.cache[source])
+        return vector
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        for source in self.sources:
+            source.close()
@@ -0,0 +1,77 @@
+import numpy as np
+
+from ringbuffer import RingBuffer
+
+
+class WelchSpectrum:
+    # Incremental Welch estimate of the deviation spectrum. Samples collect into a
+    # segment ring; every `hop` samples one Hann-windowed segment is transformed and
+    # added to a running sum over the segments that fit in `span`. Each sample is
+    # O(1), each segment O(nperseg log nperseg), and reading the estimate is O(bins).
+    def __init__(self, sample_rate=10.0, nperseg=128, overlap=0.5, span=600):
+        self.nperseg = int(nperseg)
+        self.hop = max(int(self.nperseg * (1 - overlap)), 1)
+        self.window = np.hanning(self.nperseg + 1)[:-1]
+        self.bins = self.nperseg // 2 + 1
+        self.samples = RingBuffer(self.nperseg)
+        self.segments = RingBuffer(self._segments_for(span), self.bins)
+        self.total = np.zeros(self.bins)
+        self.since_segment = 0
+        self.version = 0
+        self.set_sample_rate(sample_rate)
+
+    def _segments_for(self, span):
+        return max((int(span) - self.nperseg) // self.hop + 1, 1)
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = float(sample_rate)
+        self.freqs = np.fft.rfftfreq(self.nperseg, d=1.0 / self.sample_rate)
+        # Density scaling so the estimate does not depend on the segment length
+        self.scale = 1.0 / (self.sample_rate * np.sum(self.window ** 2))
+
+    def set_span(self, span):
+        # Average over as many segments as fit in `span` samples (the displayed history)
+        self.segments.resize(self._segments_for(span))
+        self.total = self.segments.latest().sum(axis=0)
+        self.version += 1
+
+    def clear(self):
+        self.samples.clear()
+        self.segments.clear()
+        self.total[:] = 0
+        self.since_segment = 0
+        self.version += 1
+
+    def push(self, value):
+        self.samples.append(value)
+        self.since_segment += 1
+        if self.samples.full() and self.since_segment >= self.hop:
+            self.since_segment = 0
+            self._add_segment(self.samples.latest())
+
+    def extend(self, values):
+        for value in values:
+            self.push(value)
+
+    def _add_segment(self, segment):
+        data = (segment - segment.mean()) * self.window
+        psd = np.abs(np.fft.rfft(data)) ** 2 * self.scale
+        psd[1:-1] *= 2
+        if self.segments.full():
+            self.total -= self.segments.oldest()
+        self.segments.append(psd)
+        self.total += psd
+        self.version += 1
+
+    def __len__(self):
+        return len(self.segments)
+
+    def psd(self):
+        n = len(self.segments)
+        if n == 0:
+            return self.freqs, np.zeros(self.bins)
+        return self.freqs, np.maximum(self.total / n, 0)
+
+    def magnitude(self):
+        freqs, psd = self.psd()
+        return freqs, np.sqrt(psd)
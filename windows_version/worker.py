@@ -0,0 +1,293 @@
+import datetime
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from anomaly_writer import LEVEL_CODES
+from detector_engine import DetectorEngine, SystemSampler
+from metrics import Metrics, rss_bytes
+from scheduler import DeadlineScheduler
+
+LEVEL_NAMES = {code: level for level, code in LEVEL_CODES.items()}
+HEADER_BYTES = 128
+# Integer header slots
+COUNT, WIDTH, CAPACITY, TICKS, OVERRUNS, SKIPPED = range(6)
+# Float header slots
+RATE, MEASURED_RATE, LATENESS, MAX_LATENESS = range(4)
+
+
+def result_dtype(width):
+    fields = [("time", "<f8"), ("entropy", "<f8"), ("deviation", "<f8"), ("zscore", "<f8"), ("level", "<i8")]
+    fields += [(f"v{i}", "<f8") for i in range(width)]
+    return np.dtype(fields)
+
+
+class ShmRing:
+    # Single-writer ring of fixed-width result records in shared memory. The writer
+    # fills slot count % capacity and then bumps `count`; a reader copies the slots
+    # it has not seen and re-reads `count` afterwards to discard any slot the writer
+    # lapped during the copy, so it never needs a lock and never blocks the writer.
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.ints = np.ndarray((8,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self.floats = np.ndarray((8,), dtype=np.float64, buffer=shm.buf, offset=64)
+        self.width = int(self.ints[WIDTH])
+        self.capacity = int(self.ints[CAPACITY])
+        self.dtype = result_dtype(self.width)
+        self.records = np.ndarray((self.capacity,), dtype=self.dtype, buffer=shm.buf, offset=HEADER_BYTES)
+
+    @classmethod
+    def create(cls, width, capacity=8192):
+        size = HEADER_BYTES + capacity * result_dtype(width).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[WIDTH] = width
+        header[CAPACITY] = capacity
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # The worker shares this process's resource tracker, so attaching needs no
+        # extra bookkeeping; only the creating side unlinks the segment
+        return cls(shm=shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, result):
+        count = int(self.ints[COUNT])
+        ts = result["time"]
+        if isinstance(ts, datetime.datetime):
+            ts = ts.timestamp()
+        self.records[count % self.capacity] = (ts, result["entropy"], result["deviation"], result["zscore"],
+                                               LEVEL_CODES.get(result["level"], 0), *result["vector"])
+        self.ints[COUNT] = count + 1
+
+    def read(self, since):
+        # Returns (records, new position, dropped) for everything written after `since`
+        count = int(self.ints[COUNT])
+        start = max(since, count - self.capacity)
+        if start >= count:
+            return self.records[:0].copy(), count, 0
+        records = self.records[np.arange(start, count) % self.capacity]
+        # Records the writer overwrote during the copy are discarded, including the
+        # slot of the record it may be writing now (count_after - capacity)
+        safe = int(self.ints[COUNT]) - self.capacity + 1
+        if safe > start:
+            records = records[safe - start:]
+            start = safe
+        return records, max(count, start), start - since
+
+    def publish_stats(self, scheduler):
+        self.ints[TICKS] = scheduler.ticks
+        self.ints[OVERRUNS] = scheduler.overruns
+        self.ints[SKIPPED] = scheduler.skipped
+        self.floats[RATE] = scheduler.rate
+        self.floats[MEASURED_RATE] = scheduler.measured_rate()
+        self.floats[LATENESS] = scheduler.lateness
+        self.floats[MAX_LATENESS] = scheduler.max_lateness
+
+    def stats(self):
+        return {
+            "rate": float(self.floats[RATE]),
+            "measured_rate": float(self.floats[MEASURED_RATE]),
+            "ticks": int(self.ints[TICKS]),
+            "overruns": int(self.ints[OVERRUNS]),
+            "skipped": int(self.ints[SKIPPED]),
+            "lateness": float(self.floats[LATENESS]),
+            "max_lateness": float(self.floats[MAX_LATENESS]),
+        }
+
+    def close(self):
+        # The numpy views must go before the mapping can be closed
+        self.ints = self.floats = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def pin_to_core(core):
+    import psutil
+    try:
+        psutil.Process().cpu_affinity([core])
+        return True
+    except (AttributeError, ValueError, psutil.Error):
+        # cpu_affinity is not available on every platform
+        return False
+
+
+def worker_main(control, status, backend, rate, method, sensitivity, capacity, core):
+    # Runs in the worker process: sample on the deadline scheduler, score, publish
+    pinned = pin_to_core(core) if core is not None else False
+    metrics = Metrics()
+    sampler = SystemSampler(backend, metrics=metrics)
+    # Alone in its process, so it may busy-wait the whole spin budget
+    scheduler = DeadlineScheduler(rate, spin_fraction=1.0)
+    engine = DetectorEngine(method, sensitivity, sample_rate=rate, metrics=metrics)
+    metrics.gauge("rss_bytes", rss_bytes)
+    ring = ShmRing.create(len(sampler.fields()), capacity)
+    status.put({"shm": ring.name, "gpu_info": sampler.gpu_info, "ram_info": sampler.ram_info, "pinned": pinned})
+
+    parent = multiprocessing.parent_process()
+    paused = False
+    last_check = time.monotonic()
+    try:
+        while True:
+            while True:
+                try:
+                    command, *args = control.get_nowait()
+                except queue.Empty:
+                    break
+                if command == "stop":
+                    return
+                elif command == "pause":
+                    paused = args[0]
+                elif command == "method":
+                    engine.set_method(args[0])
+                elif command == "sensitivity":
+                    engine.set_sensitivity(args[0])
+                elif command == "calibrate":
+                    engine.calibrate()
+                elif command == "rate":
+                    scheduler.set_rate(args[0])
+                    engine.set_sample_rate(args[0])
+                elif command == "load_history":
+                    engine.load_history(args[0])
+
+            now = time.monotonic()
+            if now - last_check > 1.0:
+                last_check = now
+                if parent is not None and not parent.is_alive():
+                    return
+                # The GUI mirrors these under "worker."
+                status.put({"metrics": metrics.snapshot()})
+
+            if paused:
+                scheduler.reset()
+                time.sleep(0.05)
+                continue
+
+            tick = scheduler.wait()
+            with metrics.time("sample"):
+                vector = sampler.get_system_vector()
+            with metrics.time("process"):
+                result = engine.process(vector, datetime.datetime.fromtimestamp(tick))
+            ring.write(result)
+            ring.publish_stats(scheduler)
+    finally:
+        sampler.close()
+        ring.close()
+
+
+class ProcessEngine(DetectorEngine):
+    # DetectorEngine whose sampling and scoring run in a separate process. This side
+    # only reads the shared-memory ring: poll() returns the new results and adds them
+    # to the local history and spectrum used for drawing. Control calls are applied
+    # locally and forwarded to the worker over a queue.
+    def __init__(self, backend="system", method="Attractor", sensitivity=5.0, history_len=600,
+                 sample_rate=10.0, capacity=8192, core=None, **kwargs):
+        ctx = multiprocessing.get_context("spawn")
+        self.control = ctx.Queue()
+        self.status = ctx.Queue()
+        self.process = ctx.Process(target=worker_main, daemon=True,
+                                   args=(self.control, self.status, backend, sample_rate, method,
+                                         sensitivity, capacity, core))
+        self.ring = None
+        self.position = 0
+        self.dropped = 0
+        self.gpu_info = "GPU: Detecting..."
+        self.ram_info = "RAM: Detecting..."
+        self.pinned = False
+        super().__init__(method, sensitivity, history_len, sample_rate=sample_rate, **kwargs)
+
+    def start(self, timeout=30.0):
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                info = self.status.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    raise RuntimeError("Sampling worker process failed to start")
+        self.ring = ShmRing.attach(info["shm"])
+        self.gpu_info = info["gpu_info"]
+        self.ram_info = info["ram_info"]
+        self.pinned = info["pinned"]
+        return self
+
+    def send(self, command, *args):
+        self.control.put((command, *args))
+
+    def set_sensitivity(self, value):
+        super().set_sensitivity(value)
+        self.send("sensitivity", self.sensitivity)
+
+    def set_method(self, method):
+        super().set_method(method)
+        self.send("method", method)
+
+    def set_sample_rate(self, rate):
+        super().set_sample_rate(rate)
+        self.send("rate", float(rate))
+
+    def calibrate(self):
+        super().calibrate()
+        self.send("calibrate")
+
+    def load_history(self, values):
+        values = np.array(values, dtype=np.float64)
+        super().load_history(values)
+        self.send("load_history", values)
+
+    def pause(self, paused=True):
+        self.send("pause", bool(paused))
+
+    def poll(self):
+        if self.ring is None:
+            return []
+        while True:
+            try:
+                message = self.status.get_nowait()
+            except queue.Empty:
+                break
+            if "metrics" in message:
+                self.metrics.load(message["metrics"], "worker.")
+        records, self.position, dropped = self.ring.read(self.position)
+        self.dropped += dropped
+        vectors = np.stack([records[f"v{i}"] for i in range(self.ring.width)], axis=1)
+        results = []
+        for record, vector in zip(records, vectors):
+            result = {
+                "time": datetime.datetime.fromtimestamp(record["time"]),
+                "entropy": float(record["entropy"]),
+                "deviation": float(record["deviation"]),
+                "zscore": float(record["zscore"]),
+                "level": LEVEL_NAMES.get(int(record["level"])),
+                "vector": vector
+            }
+            self.record(result)
+            results.append(result)
+        return results
+
+    def stats(self):
+        stats = self.ring.stats() if self.ring is not None else {}
+        stats["dropped"] = self.dropped
+        return stats
+
+    def close(self):
+        if self.process.is_alive():
+            self.send("stop")
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None